@@ -0,0 +1,49 @@
+"""
+Small on-disk caches shared by the deposit address scanners.
+"""
+
+import json
+import os
+import time
+
+
+class TTLCache:
+    """
+    JSON file backed key/value cache. Entries expire `ttl` seconds after they
+    were stored, so slowly-changing exchange config can be reused across runs.
+    With autosave=False, set() only updates memory and the caller calls save().
+    """
+
+    def __init__(self, path, ttl=3600, autosave=True):
+        self.path = path
+        self.ttl = ttl
+        self.autosave = autosave
+        self._data = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None or time.time() - entry['ts'] > self.ttl:
+            return None
+        return entry['value']
+
+    def delete(self, key):
+        if self._data.pop(key, None) is not None and self.autosave:
+            self.save()
+
+    def set(self, key, value):
+        self._data[key] = {'ts': time.time(), 'value': value}
+        if self.autosave:
+            self.save()
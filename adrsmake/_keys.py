@@ -0,0 +1,20 @@
+"""
+API key file loader shared by the deposit address scanners.
+"""
+
+import re
+
+# KEY=VALUE per line; blank lines and lines starting with '#' are ignored
+_KEY_LINE_RE = re.compile(r'^\s*([^#=\s][^=\n]*?)\s*=[ \t]*(.*?)\s*$', re.M)
+
+
+def load_keys(file_path):
+    """
+    Parse keys.json (despite the name, KEY=VALUE lines) into a dict.
+    Returns None if the file does not exist.
+    """
+    try:
+        with open(file_path, 'r') as f:
+            return dict(_KEY_LINE_RE.findall(f.read()))
+    except FileNotFoundError:
+        return None
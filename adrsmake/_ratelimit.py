@@ -0,0 +1,178 @@
+"""
+Shared rate-limit helpers for the deposit address scanners.
+"""
+
+import asyncio
+import contextvars
+import functools
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket: allows bursts up to `capacity` tokens while refilling at
+    `refill_per_sec` tokens per second. A request costs its API weight in tokens.
+    """
+
+    def __init__(self, capacity, refill_per_sec):
+        self.capacity = capacity
+        self.refill_per_sec = refill_per_sec
+        self.base_refill_per_sec = refill_per_sec
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        # For worker threads sharing one bucket (acquire_sync / set_rate)
+        self._lock = threading.Lock()
+
+    def set_rate(self, refill_per_sec):
+        # Settle tokens earned at the old rate before switching
+        with self._lock:
+            self._refill()
+            self.refill_per_sec = refill_per_sec
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_per_sec)
+        self.updated = now
+
+    def _take(self, tokens):
+        # Returns 0 when tokens were taken, otherwise seconds to wait before retrying
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return 0
+        return (tokens - self.tokens) / self.refill_per_sec
+
+    async def acquire(self, tokens=1):
+        while True:
+            wait = self._take(tokens)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self, tokens=1):
+        # Blocking variant for the synchronous (requests-based) scanners
+        while True:
+            with self._lock:
+                wait = self._take(tokens)
+            if not wait:
+                return
+            time.sleep(wait)
+
+
+# (status, headers) of the last response seen by the current task/thread.
+# A ContextVar keeps concurrent async workers sharing one client from
+# reading each other's responses.
+_last_response = contextvars.ContextVar('_last_response', default=(None, {}))
+# Set by rate_aware, which waits out and repeats 429s itself, so an outer
+# retry() does not multiply the sends to an endpoint asking us to slow down
+_throttle_handled = contextvars.ContextVar('_throttle_handled', default=False)
+
+
+def record_response(status, headers):
+    """Called by a client's _request right after the HTTP response arrives."""
+    _last_response.set((status, headers))
+
+
+def _retry_after_seconds(headers, default=1.0):
+    try:
+        return max(0.0, float(headers.get('Retry-After')))
+    except (TypeError, ValueError):
+        return default
+
+
+def rate_aware(adjust=None, max_throttle_retries=3):
+    """
+    Decorator for a client's _request (sync or async).
+
+    The client must expose `self.bucket` and call record_response() for each
+    response. On HTTP 429 the call waits the server's Retry-After and is repeated;
+    otherwise `adjust(bucket, headers)` lets the exchange's rate-limit headers
+    tune the bucket's refill rate.
+    """
+
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(self, *args, **kwargs):
+                for _ in range(max_throttle_retries + 1):
+                    _last_response.set((None, {}))
+                    result = await func(self, *args, **kwargs)
+                    status, headers = _last_response.get()
+                    if status != 429:
+                        break
+                    await asyncio.sleep(_retry_after_seconds(headers))
+                _throttle_handled.set(True)
+                if adjust and headers:
+                    adjust(self.bucket, headers)
+                return result
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            for _ in range(max_throttle_retries + 1):
+                _last_response.set((None, {}))
+                result = func(self, *args, **kwargs)
+                status, headers = _last_response.get()
+                if status != 429:
+                    break
+                time.sleep(_retry_after_seconds(headers))
+            _throttle_handled.set(True)
+            if adjust and headers:
+                adjust(self.bucket, headers)
+            return result
+        return wrapper
+
+    return decorator
+
+
+def backoff_delay(attempt, base=0.25):
+    """Exponential backoff with full jitter: uniform(0, base * 2**attempt)."""
+    return random.uniform(0, base * 2 ** attempt)
+
+
+def _is_transient_status(status):
+    # A 429 is only retried here when no rate_aware wrapper has dealt with it already
+    if status == 429:
+        return not _throttle_handled.get()
+    return status is not None and status >= 500
+
+
+async def retry(coro_factory, attempts=5, base=0.25, exceptions=(asyncio.TimeoutError,)):
+    """
+    Await coro_factory() until it succeeds, retrying on `exceptions` and on
+    HTTP 5xx responses (as seen through record_response), and on 429 only for
+    calls that are not @rate_aware, which retries 429 itself. The last
+    attempt's result is returned, or its exception re-raised.
+    """
+    for attempt in range(attempts):
+        last = attempt == attempts - 1
+        _last_response.set((None, {}))
+        _throttle_handled.set(False)
+        try:
+            result = await coro_factory()
+        except exceptions:
+            if last:
+                raise
+        else:
+            if last or not _is_transient_status(_last_response.get()[0]):
+                return result
+        await asyncio.sleep(backoff_delay(attempt, base))
+
+
+def retry_sync(func, attempts=5, base=0.25, exceptions=()):
+    """Blocking counterpart of retry() for the requests-based scanners."""
+    for attempt in range(attempts):
+        last = attempt == attempts - 1
+        _last_response.set((None, {}))
+        _throttle_handled.set(False)
+        try:
+            result = func()
+        except exceptions:
+            if last:
+                raise
+        else:
+            if last or not _is_transient_status(_last_response.get()[0]):
+                return result
+        time.sleep(backoff_delay(attempt, base))
@@ -1,27 +1,65 @@
-import requests
+import asyncio
+import aiohttp
 import time
 import hmac
 import hashlib
 import json
-import pandas as pd
+import orjson
+import csv
 from urllib.parse import urlencode
+from _ratelimit import TokenBucket, rate_aware, record_response, retry
+from _keys import load_keys
+
+# Network failures worth retrying with backoff
+TRANSIENT_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+
+# get_deposit_address weight is 10. Limit is 12000 weight per minute (200/sec).
+DEPOSIT_ADDRESS_WEIGHT = 10
+WEIGHT_LIMIT_1M = 12000
+# One header may at most double the base refill rate
+MAX_RATE_FACTOR = 2
+MAX_CONCURRENCY = 20
+
+OUTPUT_CSV = 'binance_deposit_addresses.csv'
+# coin -> Binance network names, reused by the Bithumb scanner to prune its net_type guesses
+COIN_CHAINS_JSON = 'coin_chains.json'
+CSV_FIELDS = ['coin', 'network', 'address', 'tag', 'url', 'full_response']
+
+def adjust_bucket_from_headers(bucket, headers):
+    # Binance reports the weight used in the current minute window
+    try:
+        used = int(headers.get('X-MBX-USED-WEIGHT-1M'))
+    except (TypeError, ValueError):
+        return
+    remaining = max(WEIGHT_LIMIT_1M - used, 0)
+    # Clamped: near the (local, possibly skewed) minute boundary this would go to 0
+    seconds_left = max(60 - (time.time() % 60), 1.0)
+    # Refill at whatever the remaining budget allows until the minute rolls over:
+    # faster than the base rate when weight is plentiful (capped), slower when it runs short
+    rate = max(remaining, DEPOSIT_ADDRESS_WEIGHT) / seconds_left
+    bucket.set_rate(min(rate, bucket.base_refill_per_sec * MAX_RATE_FACTOR))
 
 class BinanceClient:
-    def __init__(self, api_key, secret_key):
+    def __init__(self, api_key, secret_key, session):
         self.api_key = api_key
         self.secret_key = secret_key
         self.base_url = "https://api.binance.com"
+        # Shared aiohttp session, kept open for the whole scan
+        self.session = session
+        self.bucket = TokenBucket(capacity=200, refill_per_sec=200)
+        # Keyed HMAC state built once; each signature copies it instead of re-keying
+        self._hmac_template = hmac.new(secret_key.encode('utf-8'), b'', hashlib.sha256)
 
     def _sign(self, params):
+        # urlencode output is pure ASCII; hash it as one bytes buffer
         query_string = urlencode(params)
-        signature = hmac.new(
-            self.secret_key.encode('utf-8'),
-            query_string.encode('utf-8'),
-            hashlib.sha256
-        ).hexdigest()
+        h = self._hmac_template.copy()
+        h.update(query_string.encode('ascii'))
+        signature = h.hexdigest()
         return query_string + "&signature=" + signature
 
-    def _request(self, method, endpoint, params=None):
+    @rate_aware(adjust_bucket_from_headers)
+    async def _request(self, method, endpoint, params=None):
         if params is None:
             params = {}
         
@@ -37,49 +75,74 @@ class BinanceClient:
         }
         
         try:
-            if method.upper() == 'GET':
-                response = requests.get(url, headers=headers)
-            elif method.upper() == 'POST':
-                response = requests.post(url, headers=headers) # Params usually in query for Binance signed
-            
-            # response.raise_for_status() # We handle errors manually
-            return response.json()
+            # Params usually in query for Binance signed, so POST has no body either
+            async with self.session.request(method.upper(), url, headers=headers) as response:
+                record_response(response.status, response.headers)
+                # response.raise_for_status() # We handle errors manually
+                return orjson.loads(await response.read())
+        except TRANSIENT_ERRORS:
+            # Let the caller's retry() back off and try again
+            raise
         except Exception as e:
             print(f"Request error: {e}")
             return None
 
-    def get_all_coins_info(self):
+    async def get_all_coins_info(self):
         # /sapi/v1/capital/config/getall
         # Returns information of coins (available for deposit, etc)
         # Verify weight: 10
-        return self._request('GET', '/sapi/v1/capital/config/getall')
+        return await self._request('GET', '/sapi/v1/capital/config/getall')
 
-    def get_deposit_address(self, coin, network=None):
+    async def get_deposit_address(self, coin, network=None):
         # /sapi/v1/capital/deposit/address
         params = {'coin': coin}
         if network:
             params['network'] = network
-        return self._request('GET', '/sapi/v1/capital/deposit/address', params)
+        return await self._request('GET', '/sapi/v1/capital/deposit/address', params)
 
-def load_keys(file_path):
-    keys = {}
-    try:
-        with open(file_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-                if '=' in line:
-                    key, value = line.split('=', 1)
-                    keys[key.strip()] = value.strip()
-    except FileNotFoundError:
-        print(f"{file_path} not found.")
-        return None
-    return keys
-
-def main():
+async def fetch_address(client, sem, write_row, coin, network):
+    async def attempt():
+        await client.bucket.acquire(DEPOSIT_ADDRESS_WEIGHT)
+        return await client.get_deposit_address(coin, network)
+
+    async with sem:
+        # Fetch address
+        # Note: This does not generate a NEW address usually, just retrieves. 
+        # If never generated, it might auto-generate or return empty.
+        print(f"  > Fetching address for {coin} ({network})...")
+        try:
+            addr_resp = await retry(attempt, exceptions=TRANSIENT_ERRORS)
+        except TRANSIENT_ERRORS as e:
+            addr_resp = f"Request error: {e!r}"
+
+    if isinstance(addr_resp, dict) and 'address' in addr_resp:
+        # Successful
+        addr = addr_resp['address']
+        tag = addr_resp.get('tag', '')
+        url = addr_resp.get('url', '')
+
+        if addr:
+            print(f"    -> Found: {addr}")
+            # Written as soon as it is found so an interrupted scan keeps its rows
+            write_row({
+                'coin': coin,
+                'network': network,
+                'address': addr,
+                'tag': tag,
+                'url': url,
+                'full_response': str(addr_resp)
+            })
+            return True
+        print(f"    -> No address returned for {coin} ({network}) (maybe create not supported via API?)")
+    else:
+        print(f"    -> Error fetching address for {coin} ({network}): {addr_resp}")
+    return False
+
+async def main():
     # Load keys
     keys = load_keys('keys.json')
+    if keys is None:
+        print("keys.json not found.")
     if not keys:
         return
         
@@ -90,79 +153,58 @@ def main():
         print("Please ensure BINANCE_API_KEY and BINANCE_API_SECRET are set in keys.json")
         return
 
-    client = BinanceClient(api_key, secret_key)
-
-    print("Fetching coin configurations...")
-    coins_info = client.get_all_coins_info()
-    
-    if not isinstance(coins_info, list):
-        print("Failed to fetch coin info or invalid API keys.")
-        print(f"Response: {coins_info}")
-        return
+    # Pool sized to the request concurrency below; connections are kept alive
+    connector = aiohttp.TCPConnector(limit=MAX_CONCURRENCY)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        client = BinanceClient(api_key, secret_key, session)
 
-    print(f"Found {len(coins_info)} coins. Starting scan...")
-    
-    results = []
-    
-    for i, coin_data in enumerate(coins_info):
-        coin = coin_data['coin']
-        
-        # Determine networks
-        networks_list = coin_data.get('networkList', [])
-        
-        # If no networks listed, skip or log?
-        if not networks_list:
-            continue
-            
-        print(f"[{i+1}/{len(coins_info)}] Checking {coin}...")
-        
-        for net_data in networks_list:
-            network = net_data['network']
-            is_deposit_enabled = net_data.get('depositEnable', False)
-            
-            if is_deposit_enabled:
-                # time.sleep(0.05) # Rate limiting (IP weight)
-                # Fetch address
-                # Note: This does not generate a NEW address usually, just retrieves. 
-                # If never generated, it might auto-generate or return empty.
-                print(f"  > Fetching address for {coin} ({network})...")
-                
-                addr_resp = client.get_deposit_address(coin, network)
-                
-                if isinstance(addr_resp, dict) and 'address' in addr_resp:
-                    # Successful
-                    addr = addr_resp['address']
-                    tag = addr_resp.get('tag', '')
-                    url = addr_resp.get('url', '')
-                    
-                    if addr:
-                        print(f"    -> Found: {addr}")
-                        results.append({
-                            'coin': coin,
-                            'network': network,
-                            'address': addr,
-                            'tag': tag,
-                            'url': url,
-                            'full_response': str(addr_resp)
-                        })
-                    else:
-                        print(f"    -> No address returned (maybe create not supported via API?)")
-                else:
-                    print(f"    -> Error fetching address: {addr_resp}")
-                    
-            else:
-                # print(f"  > Deposit disabled for {coin} on {network}")
-                pass
+        print("Fetching coin configurations...")
+        try:
+            coins_info = await retry(client.get_all_coins_info, exceptions=TRANSIENT_ERRORS)
+        except TRANSIENT_ERRORS as e:
+            coins_info = f"Request error: {e!r}"
         
-        # Sleep periodically to avoid hitting weight limits strictly
-        # get_deposit_address weight is 10. Limit is 12000 per minute usually?
-        # 1 request per coin-network. 
-        time.sleep(0.1) 
+        if not isinstance(coins_info, list):
+            print("Failed to fetch coin info or invalid API keys.")
+            print(f"Response: {coins_info}")
+            return
+
+        print(f"Found {len(coins_info)} coins. Starting scan...")
+
+        coin_chains = {
+            coin_data['coin']: [net_data['network'] for net_data in coin_data.get('networkList', [])]
+            for coin_data in coins_info
+        }
+        with open(COIN_CHAINS_JSON, 'w', encoding='utf-8') as f:
+            json.dump(coin_chains, f, indent=2, sort_keys=True)
+
+        # 1 request per coin-network with deposits enabled.
+        tasks = []
+        for coin_data in coins_info:
+            coin = coin_data['coin']
+            # If no networks listed, nothing to fetch
+            for net_data in coin_data.get('networkList', []):
+                if net_data.get('depositEnable', False):
+                    tasks.append((coin, net_data['network']))
+
+        print(f"Fetching {len(tasks)} coin-network addresses...")
+
+        # Semaphore caps in-flight requests; the bucket enforces the weight budget
+        sem = asyncio.Semaphore(MAX_CONCURRENCY)
+        # The with block closes the CSV even on Ctrl-C
+        with open(OUTPUT_CSV, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+
+            def write_row(row):
+                writer.writerow(row)
+                f.flush()
+
+            found = await asyncio.gather(
+                *(fetch_address(client, sem, write_row, coin, network) for coin, network in tasks)
+            )
 
-    # Save
-    df = pd.DataFrame(results)
-    df.to_csv('binance_deposit_addresses.csv', index=False)
-    print("Done. Saved to binance_deposit_addresses.csv")
+    print(f"Done. Saved {sum(found)} addresses to {OUTPUT_CSV}")
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -1,18 +1,55 @@
-import jwt
 import uuid
+import base64
 import hashlib
+import hmac
 import time
-import requests
+import asyncio
+import aiohttp
 import json
-import pandas as pd
-import os
+import orjson
+import csv
+import atexit
+import signal
+import sys
+import string
 from urllib.parse import urlencode
+from _ratelimit import TokenBucket, rate_aware, record_response, retry
+from _cache import TTLCache
+
+# Requests per second shared by all workers (burst up to one second's worth)
+REQUESTS_PER_SEC = 50
+
+# Network failures worth retrying with backoff
+TRANSIENT_ERRORS = (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+
+# Characters urlencode leaves untouched
+_URL_SAFE = frozenset(string.ascii_letters + string.digits + '_.-~')
+
+def query_bytes(items):
+    # Fast path: for already URL-safe ASCII pairs urlencode is a plain join,
+    # so build the bytes directly and skip its percent-encoding loop.
+    pairs = [(str(k), str(v)) for k, v in items]
+    if all(_URL_SAFE.issuperset(k) and _URL_SAFE.issuperset(v) for k, v in pairs):
+        return b'&'.join(b'%s=%s' % (k.encode('ascii'), v.encode('ascii')) for k, v in pairs)
+    return urlencode(pairs).encode('ascii')
+
+def b64url(data):
+    # JWT flavour of base64: URL-safe alphabet, no padding
+    return base64.urlsafe_b64encode(data).rstrip(b'=')
+
+# HS256 JWT header never changes, encode it once
+JWT_HEADER_B64 = b64url(b'{"alg":"HS256","typ":"JWT"}')
 
 class BithumbClient:
-    def __init__(self, access_key, secret_key):
+    def __init__(self, access_key, secret_key, session):
         self.access_key = access_key
         self.secret_key = secret_key
         self.api_url = "https://api.bithumb.com/v1"
+        # Shared aiohttp session, kept open for the whole scan
+        self.session = session
+        self.bucket = TokenBucket(capacity=REQUESTS_PER_SEC, refill_per_sec=REQUESTS_PER_SEC)
+        # Keyed HMAC state built once; each token signature copies it
+        self._hmac_template = hmac.new(secret_key.encode('utf-8'), b'', hashlib.sha256)
 
     def _get_token(self, query_params=None):
         payload = {
@@ -28,17 +65,22 @@ class BithumbClient:
             # Note: urlencode doesn't guarantee sort in all versions, so we sort dict first?
             # actually urlencode consumes dict order in recent python.
             items = sorted(query_params.items())
-            query_string = urlencode(items)
             
             m = hashlib.sha512()
-            m.update(query_string.encode('utf-8'))
+            m.update(query_bytes(items))
             query_hash = m.hexdigest()
             payload['query_hash'] = query_hash
             payload['query_hash_alg'] = 'SHA512'
 
-        return jwt.encode(payload, self.secret_key, algorithm='HS256')
+        # Hand-rolled HS256 JWT (same output as jwt.encode, without PyJWT's per-call overhead)
+        signing_input = JWT_HEADER_B64 + b'.' + b64url(orjson.dumps(payload))
+        sig = self._hmac_template.copy()
+        sig.update(signing_input)
+        return (signing_input + b'.' + b64url(sig.digest())).decode('ascii')
 
-    def _request(self, method, endpoint, params=None, data=None):
+    # Bithumb has no usage headers; only honour Retry-After on 429
+    @rate_aware()
+    async def _request(self, method, endpoint, params=None, data=None):
         headers = {}
         
         # For POST/PUT, the body usually forms the 'query' hash in Bithumb V1/V2
@@ -55,137 +97,164 @@ class BithumbClient:
         
         try:
             if method.upper() == 'GET':
-                response = requests.get(url, headers=headers, params=params)
+                request = self.session.get(url, headers=headers, params=params)
             elif method.upper() == 'POST':
-                response = requests.post(url, headers=headers, json=data)
-            
-            # Print response text if error for debugging
-            # if not response.ok:
-            #     print(f"Error calling {endpoint}: {response.status_code} {response.reason}")
-            #     print(f"Response: {response.text}")
-                
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.HTTPError as e:
+                request = self.session.post(url, headers=headers, json=data)
+
+            async with request as response:
+                record_response(response.status, response.headers)
+                # Print response text if error for debugging
+                # if not response.ok:
+                #     print(f"Error calling {endpoint}: {response.status} {response.reason}")
+                #     print(f"Response: {await response.text()}")
+
+                # Rejected requests (bad net_type, auth) explain themselves in an 'error' body
+                if 400 <= response.status < 500 and response.status != 429:
+                    return orjson.loads(await response.read())
+                response.raise_for_status()
+                return orjson.loads(await response.read())
+        except aiohttp.ClientResponseError as e:
             # Already printed details above
             return None
+        except TRANSIENT_ERRORS:
+            # Let the caller's retry() back off and try again
+            raise
         except Exception as e:
             print(f"Unexpected error: {e}")
             return None
 
 
-    def get_markets(self):
+    async def get_markets(self):
         # Public endpoint, no auth needed technically but using _request for consistency if private needed later
         # However v1/market/all is public.
         url = f"{self.api_url}/market/all?isDetails=true"
         try:
-            resp = requests.get(url)
-            resp.raise_for_status()
-            return resp.json()
+            async with self.session.get(url) as resp:
+                resp.raise_for_status()
+                return orjson.loads(await resp.read())
         except Exception as e:
             print(f"Error fetching markets: {e}")
             return []
 
-    def get_withdraw_chance(self, currency):
+    async def get_withdraw_chance(self, currency):
         endpoint = "/withdraws/chance"
         params = {'currency': currency, 'net_type': currency} # net_type is technically optional or needed? 
         # API 2.0 Docs say params: currency. 
         # Let's try only currency first as query param.
-        return self._request('GET', endpoint, params={'currency': currency})
+        return await self._request('GET', endpoint, params={'currency': currency})
 
-    def get_existing_addresses(self):
+    async def get_existing_addresses(self):
         # Fetch all currently generated addresses if possible
         # Some exchanges allow fetching all, or per currency.
         # Bithumb v1 usually creates/retrieves per currency.
         # Let's assume we check per currency or there is a general endpoint.
         # Search said: GET /v1/deposits/coin_addresses
         endpoint = "/deposits/coin_addresses"
-        return self._request('GET', endpoint)
+        return await self._request('GET', endpoint)
 
-    def generate_address(self, currency, net_type):
+    async def generate_address(self, currency, net_type):
         endpoint = "/deposits/generate_coin_address"
         data = {
             'currency': currency,
             'net_type': net_type
         }
-        return self._request('POST', endpoint, data=data)
+        return await self._request('POST', endpoint, data=data)
 
-def main():
-    # Load keys
+# Common network types to try. 
+# Bithumb uses specific strings. We try the currency itself first, then these.
+COMMON_NETWORKS = [
+    'ERC20', 'BEP20', 'TRC20', 'POLYGON', 'SOL', 'ARBITRUM', 'OPTIMISM', 
+    'KLAY', 'AVAX', 'ADA', 'XRP', 'EOS', 'STEEM', 'HBAR', 'XLM', 'ATOM', 'DOT',
+    'ETH' # Sometimes ETH is net_type for ETH? or just currency=ETH net_type=ETH?
+]
+
+# Binance network name -> Bithumb net_type, for networks whose names differ
+BINANCE_TO_BITHUMB_NET = {
+    'ETH': 'ERC20',
+    'BSC': 'BEP20',
+    'TRX': 'TRC20',
+    'MATIC': 'POLYGON',
+    'AVAXC': 'AVAX',
+    'KAIA': 'KLAY',
+}
+
+# Written by binance_deposit_scanner (coin -> Binance networkList)
+COIN_CHAINS_JSON = 'coin_chains.json'
+
+
+def load_coin_chain_hints():
+    # currency -> plausible Bithumb net_types: the native chain plus whatever Binance lists
     try:
-        with open('keys.json', 'r') as f:
-            keys = json.load(f)
-            if keys['access_key'] == "YOUR_ACCESS_KEY":
-                print("Please configure keys.json with your actual API keys.")
-                return
-    except FileNotFoundError:
-        print("keys.json not found. Please create one.")
-        return
+        with open(COIN_CHAINS_JSON, 'r', encoding='utf-8') as f:
+            coin_chains = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        print(f"{COIN_CHAINS_JSON} not found, trying every common network (run binance_deposit_scanner first).")
+        return {}
+    hints = {}
+    for coin, networks in coin_chains.items():
+        nets = [coin] + [BINANCE_TO_BITHUMB_NET.get(net, net) for net in networks]
+        hints[coin] = list(dict.fromkeys(nets))
+    return hints
 
-    client = BithumbClient(keys['access_key'], keys['secret_key'])
+# Coins that only live on their own chain: once currency == net_type works, the
+# other candidates are never tried (they are only queued if the native one fails).
+SINGLE_CHAIN_COINS = {
+    'BTC', 'LTC', 'DOGE', 'BCH', 'XRP', 'XLM', 'ADA', 'DOT', 'ATOM', 'EOS',
+    'TRX', 'SOL', 'HBAR', 'ALGO', 'XTZ', 'ETC', 'BSV', 'STEEM', 'ICX', 'QTUM',
+}
 
-    print("Fetching markets...")
-    markets = client.get_markets()
-    if not markets:
-        print("Failed to fetch markets.")
-        return
+MAX_AUTH_ERRORS = 3
+NUM_WORKERS = 10
+
+OUTPUT_CSV = 'bithumb_deposit_addresses_bruteforce.csv'
+CSV_FIELDS = ['currency', 'net_type', 'address', 'secondary_address', 'response_msg']
+
+# net_type outcomes kept between runs: {"currency|net": "invalid"|"ok"|address}.
+# Entries expire, so a combo wrongly marked invalid is tried again on a later run.
+NET_CACHE_PATH = '.bithumb_net_types.json'
+NET_CACHE_TTL = 7 * 24 * 3600
+
+
+def load_net_cache():
+    # Saved once at exit instead of rewriting the file after every request
+    return TTLCache(NET_CACHE_PATH, ttl=NET_CACHE_TTL, autosave=False)
+
+
+def is_invalid_net_type(err):
+    # Only Bithumb's own rejection of the net_type parameter means the combo does not exist;
+    # any other error (rate limit, auth, server) says nothing about it.
+    return "net_type" in (err.get('name') or '') or "net_type" in (err.get('message') or '')
+
+
+class ScanState:
+    """Shared state for the scan workers (asyncio is single-threaded, no lock needed)."""
+
+    def __init__(self, net_cache, write_row=None):
+        self.net_cache = net_cache
+        # Rows go straight to the CSV so an interrupted scan keeps them
+        self.write_row = write_row
+        self.found_currencies = set()
+        self.consecutive_auth_errors = 0
+        # Single-chain currency -> networks to queue only if its native net_type fails
+        self.fallback_nets = {}
+
+
+async def scan_worker(client, queue, state):
+    while True:
+        currency, net = await queue.get()
+        try:
+            if state.consecutive_auth_errors >= MAX_AUTH_ERRORS:
+                # Drain the queue without issuing more requests
+                continue
+
+            async def attempt():
+                await client.bucket.acquire()
+                return await client.generate_address(currency, net)
 
-    # Extract unique currencies (e.g. KRW-BTC -> BTC)
-    currencies = set()
-    for market in markets:
-        if market['market'].startswith('KRW-'):
-            currencies.add(market['market'].split('-')[1])
-        elif market['market'].startswith('BTC-'):
-            currencies.add(market['market'].split('-')[1])
-    
-    print(f"Found {len(currencies)} currencies.")
-    
-    results = []
-
-    # Bithumb API rate limit is usually strict. Be careful.
-    
-    consecutive_auth_errors = 0
-    MAX_AUTH_ERRORS = 3
-    
-    # Common network types to try. 
-    # Bithumb uses specific strings. We try the currency itself first, then these.
-    COMMON_NETWORKS = [
-        'ERC20', 'BEP20', 'TRC20', 'POLYGON', 'SOL', 'ARBITRUM', 'OPTIMISM', 
-        'KLAY', 'AVAX', 'ADA', 'XRP', 'EOS', 'STEEM', 'HBAR', 'XLM', 'ATOM', 'DOT',
-        'ETH' # Sometimes ETH is net_type for ETH? or just currency=ETH net_type=ETH?
-    ]
-
-    for i, currency in enumerate(sorted(currencies)):
-        if consecutive_auth_errors >= MAX_AUTH_ERRORS:
-            print("\n[!] Stopping due to consecutive authentication errors.")
-            print("[!] Please check your API keys in keys.json.")
-            break
-
-        print(f"Processing {currency} ({i+1}/{len(currencies)})...")
-        time.sleep(0.1) # Base rate limiting
-
-        # Networks to try for this currency
-        networks_to_try = [currency] + COMMON_NETWORKS
-        # Remove duplicates while preserving order
-        networks_to_try = list(dict.fromkeys(networks_to_try))
-
-        found_for_currency = False
-        
-        for net in networks_to_try:
-            # Skip obviously wrong combos to save requests? 
-            # E.g. don't try TRC20 for BTC if we know it doesn't support it? 
-            # But we don't know the map. Bithumb might wrap BTC in ERC20? (WBTC?)
-            # But usually 'currency'='BTC' implies native.
-            
-            # Optimization: If we already found a native address, maybe we don't need token networks?
-            # User wants "ALL" (전부). So we should try meaningful ones.
-            # But brute forcing 20 nets per coin = 8000 requests. 
-            # We'll try to be fast but handling errors.
-            
-            # print(f"  > Checking {net}...")
             resp = None
             try:
-                resp = client.generate_address(currency, net)
+                # HTTP 5xx/429 come back as None with the status recorded, and are retried too
+                resp = await retry(attempt, exceptions=TRANSIENT_ERRORS)
             except Exception as e:
                 # If _request raises exception (it shouldn't, returns None/dict usually)
                 pass
@@ -198,52 +267,132 @@ def main():
                     'secondary_address': resp.get('secondary_address'),
                     'response_msg': 'Success'
                 }
-                results.append(addr_info)
-                print(f"    -> Found {net}: {addr_info['address']}")
-                found_for_currency = True
-                
-                # If we found it via 'currency' net_type, it's likely the main chain.
-                # Should we continue? Yes, for multi-chain support.
-                
+                state.write_row(addr_info)
+                state.net_cache.set(f"{currency}|{net}", addr_info['address'] or 'ok')
+                print(f"    -> Found {currency}/{net}: {addr_info['address']}")
+                state.found_currencies.add(currency)
+                # Reset consecutive errors if we succeeded
+                state.consecutive_auth_errors = 0
+
             elif resp and 'error' in resp:
                 err = resp['error']
                 # Check for net_type error
                 msg = err.get('message', '')
-                if "net_type" in msg or "value" in msg:
+                if is_invalid_net_type(err):
                     # Invalid net_type for this currency
-                    pass
+                    state.net_cache.set(f"{currency}|{net}", 'invalid')
                 elif "invalid_jwt" in msg or "unauthorized" in msg.lower():
                     print(f"    [!] Auth Error: {msg}")
-                    consecutive_auth_errors += 1
-                    if consecutive_auth_errors >= MAX_AUTH_ERRORS:
-                        break
+                    state.consecutive_auth_errors += 1
                 else:
                     # Other error (e.g. rate limit)
-                   pass
-            
-            # Small delay between network attempts for same currency
-            # time.sleep(0.05) 
+                    pass
+
+            if net == currency and currency not in state.found_currencies:
+                for fallback in state.fallback_nets.pop(currency, []):
+                    queue.put_nowait((currency, fallback))
+        finally:
+            queue.task_done()
+
+
+async def main():
+    # Load keys
+    try:
+        with open('keys.json', 'r') as f:
+            keys = json.load(f)
+            if keys['access_key'] == "YOUR_ACCESS_KEY":
+                print("Please configure keys.json with your actual API keys.")
+                return
+    except FileNotFoundError:
+        print("keys.json not found. Please create one.")
+        return
+
+    # One pooled keep-alive connection per worker
+    connector = aiohttp.TCPConnector(limit=NUM_WORKERS)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        client = BithumbClient(keys['access_key'], keys['secret_key'], session)
+
+        print("Fetching markets...")
+        markets = await client.get_markets()
+        if not markets:
+            print("Failed to fetch markets.")
+            return
+
+        # Extract unique currencies (e.g. KRW-BTC -> BTC)
+        currencies = set()
+        for market in markets:
+            if market['market'].startswith('KRW-'):
+                currencies.add(market['market'].split('-')[1])
+            elif market['market'].startswith('BTC-'):
+                currencies.add(market['market'].split('-')[1])
         
-        if not found_for_currency:
-             results.append({
-                'currency': currency,
-                'net_type': 'Unknown',
-                'address': None,
-                'secondary_address': None,
-                'response_msg': 'No valid network found'
-            })
-        else:
-            # Reset consecutive errors if we succeeded
-            consecutive_auth_errors = 0
-            
-        # Determine if we should pause more
-        if i % 10 == 0:
-            time.sleep(0.5)
+        print(f"Found {len(currencies)} currencies.")
+
+        state = ScanState(load_net_cache())
+        # Persist the cache even if the run is interrupted (Ctrl-C / kill)
+        atexit.register(state.net_cache.save)
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(1))
+
+        # Bithumb API rate limit is usually strict. Be careful.
+        # User wants "ALL" (전부), but brute forcing 20 nets per coin = 8000 requests.
+        # Coins Binance knows about only get their plausible chains tried.
+        coin_chain_hints = load_coin_chain_hints()
+        queue = asyncio.Queue()
+        skipped = 0
+        for currency in sorted(currencies):
+            # Networks to try for this currency
+            networks_to_try = coin_chain_hints.get(currency, [currency] + COMMON_NETWORKS)
+            # Remove duplicates while preserving order
+            networks_to_try = list(dict.fromkeys(networks_to_try))
+            candidates = []
+            for net in networks_to_try:
+                if state.net_cache.get(f"{currency}|{net}") == 'invalid':
+                    skipped += 1
+                    continue
+                candidates.append(net)
+            if currency in SINGLE_CHAIN_COINS and currency in candidates:
+                # Try the native chain alone; the rest wait for it to fail
+                candidates.remove(currency)
+                state.fallback_nets[currency] = candidates
+                candidates = [currency]
+            for net in candidates:
+                queue.put_nowait((currency, net))
+
+        deferred = sum(len(nets) for nets in state.fallback_nets.values())
+        print(f"Queued {queue.qsize()} currency/network combinations "
+              f"({skipped} known-invalid skipped, {deferred} held back for single-chain coins).")
+
+        # The with block closes the CSV even on Ctrl-C
+        with open(OUTPUT_CSV, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+
+            def write_row(row):
+                writer.writerow(row)
+                f.flush()
+
+            state.write_row = write_row
+            workers = [asyncio.create_task(scan_worker(client, queue, state)) for _ in range(NUM_WORKERS)]
+            await queue.join()
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+            for currency in sorted(currencies - state.found_currencies):
+                write_row({
+                    'currency': currency,
+                    'net_type': 'Unknown',
+                    'address': None,
+                    'secondary_address': None,
+                    'response_msg': 'No valid network found'
+                })
+
+    if state.consecutive_auth_errors >= MAX_AUTH_ERRORS:
+        print("\n[!] Stopped due to consecutive authentication errors.")
+        print("[!] Please check your API keys in keys.json.")
 
-    # Convert to DataFrame and save
-    df = pd.DataFrame(results)
-    df.to_csv('bithumb_deposit_addresses_bruteforce.csv', index=False)
-    print("Done. Saved to bithumb_deposit_addresses_bruteforce.csv")
+    state.net_cache.save()
+    print(f"Done. Saved to {OUTPUT_CSV}")
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -1,11 +1,11 @@
-import requests
 import json
-import time
+from bybit_deposit_scanner import get_client
 
 def main():
-    # Only fetch coin info to debug chain names
-    url = "https://api.bybit.com/v5/asset/coin/query-info?coin=USDT"
-    resp = requests.get(url).json()
+    # Only fetch coin info to debug chain names (served from the shared TTL cache when fresh)
+    client = get_client()
+    if client is None: return
+    resp = client.get_coin_info_cached('USDT')
     print(json.dumps(resp, indent=2))
 
 if __name__ == "__main__":
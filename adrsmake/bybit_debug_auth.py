@@ -1,14 +1,11 @@
 import json
 import time
-from bybit_deposit_scanner import load_keys, BybitClient
+from bybit_deposit_scanner import get_client, TRANSIENT_ERRORS
+from _ratelimit import backoff_delay, retry_sync
 
 def main():
-    keys = load_keys('keys.json')
-    if not keys: return
-    
-    api_key = keys.get('BYBIT_API_KEY')
-    secret_key = keys.get('BYBIT_API_SECRET')
-    client = BybitClient(api_key, secret_key)
+    client = get_client()
+    if client is None: return
     
     # Debug Coin Info
     print("Fetching 0G and 1INCH Info...")
@@ -18,9 +15,13 @@ def main():
         # Retry loop: check 3 times with delay
         for attempt in range(3):
             # query-info for coin
-            resp = client._request('GET', '/v5/asset/coin/query-info', {'coin': coin_symbol})
+            try:
+                resp = retry_sync(lambda: client._request('GET', '/v5/asset/coin/query-info', {'coin': coin_symbol}),
+                                  exceptions=TRANSIENT_ERRORS)
+            except TRANSIENT_ERRORS as e:
+                resp = f"Request error: {e!r}"
             
-            if resp and resp['retCode'] == 0:
+            if isinstance(resp, dict) and resp['retCode'] == 0:
                 rows = resp['result']['rows']
                 if rows:
                     coin_info = rows[0]
@@ -29,9 +30,13 @@ def main():
                     for chain in chains:
                         chainType = chain.get('chainType')
                         # print(f"Checking {coin_symbol} on {chainType} (Attempt {attempt+1})...")
-                        addr_resp = client.get_deposit_address(coin_symbol, chainType)
+                        try:
+                            addr_resp = retry_sync(lambda: client.get_deposit_address(coin_symbol, chainType),
+                                                   exceptions=TRANSIENT_ERRORS)
+                        except TRANSIENT_ERRORS as e:
+                            addr_resp = f"Request error: {e!r}"
                         
-                        if addr_resp and addr_resp.get('retCode') == 0:
+                        if isinstance(addr_resp, dict) and addr_resp.get('retCode') == 0:
                             res_rows = addr_resp.get('result', {}).get('rows', [])
                             if res_rows:
                                 print(f"  -> SUCCESS! Found on {chainType}: {res_rows[0]['address']}")
@@ -49,7 +54,7 @@ def main():
                 print(f"Error fetching coin info: {resp}")
             
             if attempt < 2:
-                time.sleep(1) # wait 1 sec before retry
+                time.sleep(backoff_delay(attempt, base=0.5)) # jittered backoff before retry
 
 if __name__ == "__main__":
     main()
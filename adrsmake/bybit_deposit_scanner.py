@@ -1,39 +1,78 @@
 import requests
+from requests.adapters import HTTPAdapter
 import hmac
 import hashlib
 import json
+import orjson
 import time
-import pandas as pd
+import csv
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from _ratelimit import TokenBucket, rate_aware, record_response, retry_sync
+from _cache import TTLCache
+from _keys import load_keys
 
-def load_keys(file_path):
-    keys = {}
+# Network failures worth retrying with backoff
+TRANSIENT_ERRORS = (requests.RequestException,)
+
+OUTPUT_CSV = 'bybit_deposit_addresses.csv'
+CSV_FIELDS = ['coin', 'chain', 'address', 'tag', 'chain_orig']
+# Concurrent query-address lookups; the token bucket still caps the request rate
+MAX_WORKERS = 8
+RECV_WINDOW_BYTES = b"5000"
+
+def adjust_bucket_from_headers(bucket, headers):
+    # Bybit reports the requests left in the current window and when it resets
+    remaining = headers.get('X-Bapi-Limit-Status')
+    reset_ts = headers.get('X-Bapi-Limit-Reset-Timestamp')
+    if remaining is None or reset_ts is None:
+        return
     try:
-        with open(file_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-                if '=' in line:
-                    key, value = line.split('=', 1)
-                    keys[key.strip()] = value.strip()
-    except FileNotFoundError:
-        return None
-    return keys
+        seconds_left = (int(reset_ts) - time.time() * 1000) / 1000.0
+        remaining = int(remaining)
+    except ValueError:
+        return
+    if seconds_left <= 0:
+        bucket.set_rate(bucket.base_refill_per_sec)
+        return
+    # Spread what is left over the rest of the window, never above the base rate
+    bucket.set_rate(min(bucket.base_refill_per_sec, max(remaining, 1) / seconds_left))
 
 class BybitClient:
     def __init__(self, api_key, secret_key):
         self.api_key = api_key
         self.secret_key = secret_key
         self.base_url = "https://api.bybit.com"
+        # deposit/query-address pacing, previously a flat 0.1s sleep per request
+        self.bucket = TokenBucket(capacity=10, refill_per_sec=10)
+        # Chain configs change rarely; reuse query-info for an hour across runs
+        self.coin_info_cache = TTLCache('.bybit_coin_info.json', ttl=3600)
+        # Keyed HMAC state built once; each signature copies it instead of re-keying
+        self._hmac_template = hmac.new(secret_key.encode("utf-8"), b"", hashlib.sha256)
+        self._api_key_bytes = api_key.encode("utf-8")
+        # (coin, chain_type) -> query-address response, for get_deposit_address_cached
+        self._deposit_address_cache = {}
+        # Keep-alive session: later requests reuse the pooled TLS connection
+        self.sess = requests.Session()
+        self.sess.mount("https://", HTTPAdapter(pool_connections=20, pool_maxsize=20))
+        self.sess.headers.update({
+            "X-BAPI-API-KEY": self.api_key,
+            "X-BAPI-SIGN-TYPE": "2",
+            "Content-Type": "application/json"
+        })
 
     def _get_signature(self, params_str, timestamp):
         # Bybit v5 signature: HMAC_SHA256(timestamp + apiKey + recvWindow + params, secret)
-        recv_window = "5000"
-        payload = f"{timestamp}{self.api_key}{recv_window}{params_str}"
-        return hmac.new(bytes(self.secret_key, "utf-8"), payload.encode("utf-8"), hashlib.sha256).hexdigest()
+        # Fed piecewise into the keyed HMAC copy rather than joined into one payload string
+        h = self._hmac_template.copy()
+        h.update(timestamp.encode("ascii"))
+        h.update(self._api_key_bytes)
+        h.update(RECV_WINDOW_BYTES)
+        h.update(params_str.encode("utf-8"))
+        return h.hexdigest()
 
+    @rate_aware(adjust_bucket_from_headers)
     def _request(self, method, endpoint, params=None):
-        timestamp = str(int(time.time() * 1000))
+        timestamp = str(time.time_ns() // 1_000_000)
         recv_window = "5000"
         
         params_str = ""
@@ -53,21 +92,23 @@ class BybitClient:
 
         signature = self._get_signature(params_str, timestamp)
 
+        # API key, sign type and content type are session headers
         headers = {
-            "X-BAPI-API-KEY": self.api_key,
             "X-BAPI-SIGN": signature,
-            "X-BAPI-SIGN-TYPE": "2",
             "X-BAPI-TIMESTAMP": timestamp,
-            "X-BAPI-RECV-WINDOW": recv_window,
-            "Content-Type": "application/json"
+            "X-BAPI-RECV-WINDOW": recv_window
         }
 
         try:
             if method == "GET":
-                resp = requests.get(url, headers=headers)
+                resp = self.sess.get(url, headers=headers)
             else:
-                resp = requests.post(url, headers=headers, data=params_str)
-            return resp.json()
+                resp = self.sess.post(url, headers=headers, data=params_str)
+            record_response(resp.status_code, resp.headers)
+            return orjson.loads(resp.content)
+        except TRANSIENT_ERRORS:
+            # Let the caller's retry_sync() back off and try again
+            raise
         except Exception as e:
             print(f"Error: {e}")
             return None
@@ -76,23 +117,76 @@ class BybitClient:
         # /v5/asset/coin/query-info
         return self._request('GET', '/v5/asset/coin/query-info')
 
+    def get_coin_info_cached(self, coin=None):
+        # Same as get_coin_info (optionally for a single coin), served from the TTL cache when fresh
+        key = coin or '*'
+        resp = self.coin_info_cache.get(key)
+        if resp is not None:
+            return resp
+        resp = self._request('GET', '/v5/asset/coin/query-info', {'coin': coin} if coin else None)
+        if isinstance(resp, dict) and resp.get('retCode') == 0:
+            self.coin_info_cache.set(key, resp)
+        return resp
+
     def get_deposit_address(self, coin, chain_type):
         # /v5/asset/deposit/query-address
         return self._request('GET', '/v5/asset/deposit/query-address', {'coin': coin, 'chainType': chain_type})
 
+    def get_deposit_addresses(self, coin):
+        # Without chainType, query-address returns every chain of the coin in result.chains
+        return self._request('GET', '/v5/asset/deposit/query-address', {'coin': coin})
+
+    def get_deposit_address_cached(self, coin, chain_type):
+        # Memoized get_deposit_address. Only responses that carry an address are kept,
+        # so callers retrying an empty/failed lookup still reach the API.
+        key = (coin, chain_type)
+        resp = self._deposit_address_cache.get(key)
+        if resp is not None:
+            return resp
+        resp = self.get_deposit_address(coin, chain_type)
+        if isinstance(resp, dict) and resp.get('retCode') == 0 and (resp.get('result') or {}).get('rows'):
+            self._deposit_address_cache[key] = resp
+        return resp
+
+def iter_deposit_chains(coins_data):
+    # Yields (coin, chainType, chain) for every chain of the query-info rows that accepts deposits
+    for item in coins_data:
+        coin = item['coin']
+        # chains structure: item['chains'] array holds the per-chain details
+        for chain_info in item.get('chains', []):
+            # Use 'chainType' explicitly as tested in debug script
+            target_chain = chain_info.get('chainType') or chain_info.get('chain')
+            # If still None, skip
+            if not target_chain:
+                continue
+            if chain_info.get('chainDeposit') == '1': # '1' is enabled
+                yield coin, target_chain, chain_info.get('chain')
+
+_client = None
+
+def get_client(keys_path='keys.json'):
+    # One BybitClient per process: the debug/check scripts and the full scan
+    # share its session, token bucket and caches instead of each building one
+    global _client
+    if _client is None:
+        keys = load_keys(keys_path)
+        if not keys:
+            return None
+
+        api_key = keys.get('BYBIT_API_KEY')
+        secret_key = keys.get('BYBIT_API_SECRET')
+
+        if not api_key or not secret_key:
+            print("Missing Bybit keys")
+            return None
+
+        _client = BybitClient(api_key, secret_key)
+    return _client
+
 def main():
-    keys = load_keys('keys.json')
-    if not keys:
+    client = get_client()
+    if client is None:
         return
-        
-    api_key = keys.get('BYBIT_API_KEY')
-    secret_key = keys.get('BYBIT_API_SECRET')
-    
-    if not api_key or not secret_key:
-        print("Missing Bybit keys")
-        return
-
-    client = BybitClient(api_key, secret_key)
     
     print("Fetching Bybit Coins...")
     # Bybit returns paginated coin info? Or all?
@@ -101,8 +195,11 @@ def main():
     # Let's try to fetch all if needed, but docs say "Returns all coins" usually for query-info if no coin specified?
     # Actually checking docs: "coin" is optional.
     
-    resp = client.get_coin_info()
-    if not resp or resp.get('retCode') != 0:
+    try:
+        resp = retry_sync(client.get_coin_info_cached, exceptions=TRANSIENT_ERRORS)
+    except TRANSIENT_ERRORS as e:
+        resp = f"Request error: {e!r}"
+    if not isinstance(resp, dict) or resp.get('retCode') != 0:
         print(f"Failed to fetch coins: {resp}")
         return
 
@@ -112,66 +209,54 @@ def main():
     # Bybit returns rows per coin-chain combination.
     # e.g. Row 1: coin=USDT, chain=ERC20
     # Row 2: coin=USDT, chain=TRC20
-    
-    results = []
-    
-    for i, item in enumerate(coins_data):
-        coin = item['coin']
-        # chain = item['chain'] # Incorrect, chain info is in 'chains' list
-        
-        # Check if deposit is allowed
-        # chains structure: item['chains'] array usually contains details
-        chains_info = item.get('chains', [])
-        
-        # wait, structure of query-info result rows:
-        # coin, call chains (list of dicts)
-        
-        for chain_info in chains_info:
-            # Debug: print keys once
-            # print(f"DEBUG keys: {chain_info.keys()}")
-            # print(f"DEBUG values: {chain_info}")
-            # exit() 
-            
-            # Use 'chainType' explicitly as tested in debug script
-            target_chain = chain_info.get('chainType')
-            if not target_chain:
-                 target_chain = chain_info.get('chain')
-            
-            # If still None, skip
-            if not target_chain:
-                continue
-            
-            deposit_status = chain_info.get('chainDeposit') # '1' for enabled?
-            
-            if deposit_status == '1': # Assuming 1 is enabled
-                print(f"Checking {coin} on {target_chain}...")
-                
-                # Fetch address
-                addr_resp = client.get_deposit_address(coin, target_chain)
-                
-                if addr_resp and addr_resp.get('retCode') == 0:
-                    res_rows = addr_resp.get('result', {}).get('rows', [])
-                    if res_rows:
-                        addr_data = res_rows[0]
-                        print(f"  -> Found: {addr_data['address']}")
-                        results.append({
-                            'coin': coin,
-                            'chain': chain_type,
-                            'address': addr_data['address'],
-                            'tag': addr_data.get('tag'),
-                            'chain_orig': chain_data if 'chain_data' in locals() else ''
-                        })
-                    else:
-                        print("  -> No address returned.")
+
+    def fetch(coin, target_chain):
+        def attempt():
+            client.bucket.acquire_sync()
+            return client.get_deposit_address(coin, target_chain)
+
+        try:
+            return retry_sync(attempt, exceptions=TRANSIENT_ERRORS)
+        except TRANSIENT_ERRORS as e:
+            print(f"  -> Request error ({coin}/{target_chain}): {e}")
+            return None
+
+    # Rows are written as they are found; the with block closes the CSV even on Ctrl-C
+    with open(OUTPUT_CSV, 'w', newline='', encoding='utf-8') as f, \
+            ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+
+        # Each lookup is submitted as soon as its chain is seen instead of one by one
+        futures = {}
+        for coin, target_chain, chain_raw in iter_deposit_chains(coins_data):
+            print(f"Checking {coin} on {target_chain}...")
+            futures[pool.submit(fetch, coin, target_chain)] = (coin, target_chain, chain_raw)
+
+        for future in as_completed(futures):
+            coin, target_chain, chain_raw = futures[future]
+            addr_resp = future.result()
+
+            if addr_resp and addr_resp.get('retCode') == 0:
+                res_rows = addr_resp.get('result', {}).get('rows', [])
+                if res_rows:
+                    addr_data = res_rows[0]
+                    print(f"  -> Found: {addr_data['address']}")
+                    writer.writerow({
+                        'coin': coin,
+                        'chain': target_chain,
+                        'address': addr_data['address'],
+                        'tag': addr_data.get('tag'),
+                        'chain_orig': chain_raw
+                    })
+                    f.flush()
                 else:
-                    # print(f"  -> Error: {addr_resp.get('retMsg')}")
-                    pass
-                
-                time.sleep(0.1)
-
-    df = pd.DataFrame(results)
-    df.to_csv('bybit_deposit_addresses.csv', index=False)
-    print("Done. Saved to bybit_deposit_addresses.csv")
+                    print("  -> No address returned.")
+            else:
+                # print(f"  -> Error: {addr_resp.get('retMsg')}")
+                pass
+
+    print(f"Done. Saved to {OUTPUT_CSV}")
 
 if __name__ == "__main__":
     main()
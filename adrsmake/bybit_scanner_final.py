@@ -4,7 +4,7 @@ Fetch ALL deposit addresses (all coins + all chains) for a Bybit MASTER account
 
 Flow:
 1) GET /v5/asset/coin/query-info  -> discover all coins + their chains (and deposit status)
-2) For each coin:
+2) For each coin (concurrently, bounded by --concurrency):
    GET /v5/asset/deposit/query-address?coin=COIN  -> returns chains[] with addressDeposit/tagDeposit/chainType/chain
 3) Join (coin, chain) with coin-info for deposit/withdraw status and metadata
 4) Export JSON and/or CSV
@@ -18,6 +18,7 @@ Docs:
 from __future__ import annotations
 
 import argparse
+import asyncio
 import csv
 import hashlib
 import hmac
@@ -25,11 +26,18 @@ import json
 import os
 import sys
 import time
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from operator import itemgetter
 from typing import Any, Dict, List, Optional, Tuple
 from urllib.parse import urlencode, quote
 
-import requests
+import aiohttp
+from yarl import URL
+
+try:
+    import orjson
+except ImportError:  # optional: stdlib json is used instead
+    orjson = None
 
 
 @dataclass
@@ -37,30 +45,90 @@ class BybitAuth:
     api_key: str
     api_secret: str
     recv_window: str = "5000"  # milliseconds
+    api_secret_bytes: bytes = field(init=False, repr=False)
+    api_key_bytes: bytes = field(init=False, repr=False)
+    recv_window_bytes: bytes = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        # Encoded once per process rather than on every signature
+        self.api_secret_bytes = self.api_secret.encode("utf-8")
+        self.api_key_bytes = self.api_key.encode("utf-8")
+        self.recv_window_bytes = self.recv_window.encode("ascii")
 
 
 class BybitV5Client:
-    def __init__(self, base_url: str, auth: BybitAuth, timeout: int = 15):
+    def __init__(self, base_url: str, auth: BybitAuth, sess: aiohttp.ClientSession, timeout: int = 15):
         self.base_url = base_url.rstrip("/")
         self.auth = auth
-        self.sess = requests.Session()
-        self.timeout = timeout
+        # Shared keep-alive session, owned by the caller
+        self.sess = sess
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        # Keyed HMAC state built once; each signature copies it instead of re-keying
+        self._hmac_template = hmac.new(auth.api_secret_bytes, None, hashlib.sha256)
+        # path -> (X-Bapi-Limit-Status, X-Bapi-Limit-Reset-Timestamp) from its last response;
+        # limits are per endpoint, so each path keeps its own budget
+        self._limits: Dict[str, Tuple[int, int]] = {}
 
     @staticmethod
     def _now_ms() -> str:
-        return str(int(time.time() * 1000))
+        return str(time.time_ns() // 1_000_000)
 
     def _sign_get(self, timestamp_ms: str, query_string: str) -> str:
         """
         HMAC_SHA256(secret, timestamp + api_key + recv_window + queryString) -> lowercase hex
         """
-        prehash = f"{timestamp_ms}{self.auth.api_key}{self.auth.recv_window}{query_string}"
-        sig = hmac.new(
-            self.auth.api_secret.encode("utf-8"),
-            prehash.encode("utf-8"),
-            hashlib.sha256,
-        ).hexdigest()
-        return sig.lower()
+        # Parts go straight into the keyed HMAC copy; no joined prehash buffer is built
+        h = self._hmac_template.copy()
+        h.update(timestamp_ms.encode("ascii"))
+        h.update(self.auth.api_key_bytes)
+        h.update(self.auth.recv_window_bytes)
+        h.update(query_string.encode("utf-8"))
+        return h.hexdigest()
+
+    @staticmethod
+    def _query_string(params: Dict[str, Any]) -> str:
+        """
+        urlencode(params, doseq=True, quote_via=quote), with a fast path for the single
+        scalar pair (coin=...) sent on every deposit-address call. Same quote() call and
+        safe="" as urlencode, so the signed string is byte-for-byte identical.
+        """
+        if len(params) == 1:
+            k, v = next(iter(params.items()))
+            if isinstance(v, (str, int)):
+                return f"{quote(str(k), safe='')}={quote(str(v), safe='')}"
+        return urlencode(params, doseq=True, quote_via=quote)
+
+    def _needs_resign(self, timestamp_ms: Optional[str]) -> bool:
+        """
+        True when there is no signature yet, or when the one made at timestamp_ms is
+        within 1s of falling out of recv_window.
+        """
+        if timestamp_ms is None:
+            return True
+        age_ms = time.time_ns() // 1_000_000 - int(timestamp_ms)
+        return age_ms >= int(self.auth.recv_window) - 1000
+
+    def _note_limit(self, path: str, limit_status: Optional[str], reset_ts: Optional[str]) -> None:
+        if limit_status is None or reset_ts is None:
+            return
+        try:
+            self._limits[path] = (int(limit_status), int(reset_ts))
+        except ValueError:
+            pass
+
+    async def _wait_for_budget(self, path: str) -> None:
+        """
+        Hold the request back until the window resets when the last response for
+        this endpoint said its budget is used up, instead of spending a request on 10006.
+        """
+        remaining, reset_ms = self._limits.get(path, (None, 0))
+        if remaining is None or remaining > 1:
+            return
+        wait_ms = reset_ms - time.time_ns() // 1_000_000
+        if wait_ms > 0:
+            await asyncio.sleep(wait_ms / 1000.0)
+        # Window has rolled over; the next response reports the fresh budget
+        self._limits.pop(path, None)
 
     def _headers(self, timestamp_ms: str, signature: str) -> Dict[str, str]:
         # Many Bybit V5 examples include X-BAPI-SIGN-TYPE: 2; harmless to include.
@@ -73,34 +141,42 @@ class BybitV5Client:
             "Content-Type": "application/json",
         }
 
-    def _request_get(self, path: str, params: Optional[Dict[str, Any]] = None, max_retries: int = 8) -> Dict[str, Any]:
+    async def _request_get(self, path: str, params: Optional[Dict[str, Any]] = None, max_retries: int = 8) -> Dict[str, Any]:
         """
-        Signed GET with simple rate-limit/backoff handling.
-        If retCode == 10006, we back off using X-Bapi-Limit-Reset-Timestamp when possible.
+        Signed GET with rate-limit/backoff handling.
+        X-Bapi-Limit-Status is tracked per endpoint so requests wait for the window to
+        reset before the budget runs out; if retCode == 10006 still happens, we back off
+        using X-Bapi-Limit-Reset-Timestamp when possible.
         """
         params = params or {}
 
         # Deterministic query string; must match what we send in URL.
-        query_string = urlencode(params, doseq=True, quote_via=quote)
+        query_string = self._query_string(params)
         url = f"{self.base_url}{path}"
         if query_string:
             url = f"{url}?{query_string}"
 
+        ts: Optional[str] = None
+        headers: Dict[str, str] = {}
         for attempt in range(max_retries):
-            ts = self._now_ms()
-            sig = self._sign_get(ts, query_string)
-            headers = self._headers(ts, sig)
-
-            resp = self.sess.get(url, headers=headers, timeout=self.timeout)
-            # If you want to use Bybit rate limit headers proactively:
-            # X-Bapi-Limit-Status, X-Bapi-Limit, X-Bapi-Limit-Reset-Timestamp
-            reset_ts = resp.headers.get("X-Bapi-Limit-Reset-Timestamp")
-            limit_status = resp.headers.get("X-Bapi-Limit-Status")
+            await self._wait_for_budget(path)
+            # A rate-limited (10006) retry reuses the signed headers while still inside recv_window
+            if self._needs_resign(ts):
+                ts = self._now_ms()
+                sig = self._sign_get(ts, query_string)
+                headers = self._headers(ts, sig)
+
+            # encoded=True: send the query exactly as signed, without aiohttp re-quoting it
+            async with self.sess.get(URL(url, encoded=True), headers=headers, timeout=self.timeout) as resp:
+                reset_ts = resp.headers.get("X-Bapi-Limit-Reset-Timestamp")
+                limit_status = resp.headers.get("X-Bapi-Limit-Status")
+                body = await resp.read()
+            self._note_limit(path, limit_status, reset_ts)
 
             try:
-                data = resp.json()
+                data = orjson.loads(body) if orjson is not None else json.loads(body)
             except Exception:
-                raise RuntimeError(f"Non-JSON response {resp.status_code}: {resp.text[:200]}")
+                raise RuntimeError(f"Non-JSON response {resp.status}: {body[:200]!r}")
 
             ret_code = data.get("retCode")
             if ret_code == 0:
@@ -111,7 +187,7 @@ class BybitV5Client:
                 sleep_s = 1.0
                 if reset_ts:
                     try:
-                        now_ms = int(time.time() * 1000)
+                        now_ms = time.time_ns() // 1_000_000
                         reset_ms = int(reset_ts)
                         # reset_ts can be "current timestamp" when not exceeded; still safe.
                         sleep_s = max(0.5, (reset_ms - now_ms) / 1000.0 + 0.2)
@@ -120,13 +196,14 @@ class BybitV5Client:
                 else:
                     # fallback exponential backoff
                     sleep_s = min(8.0, 0.8 * (2 ** attempt))
-                time.sleep(sleep_s)
+                await asyncio.sleep(sleep_s)
                 continue
 
             # Timestamp or auth issues -> small backoff, then retry
             # (Bybit requires timestamp within server_time - recv_window <= ts < server_time + 1000)
             if ret_code in (10002, 10003, 10004, 10005):
-                time.sleep(min(2.0, 0.4 * (2 ** attempt)))
+                ts = None  # always re-sign with a fresh timestamp
+                await asyncio.sleep(min(2.0, 0.4 * (2 ** attempt)))
                 continue
 
             # Other errors: break early but keep message
@@ -134,36 +211,68 @@ class BybitV5Client:
 
         raise RuntimeError(f"Failed after retries: {url}")
 
-    def get_coin_info_all(self) -> List[Dict[str, Any]]:
-        data = self._request_get("/v5/asset/coin/query-info", params={})
+    async def get_coin_info_all(self) -> List[Dict[str, Any]]:
+        data = await self._request_get("/v5/asset/coin/query-info", params={})
         rows = (data.get("result") or {}).get("rows") or []
         return rows
 
-    def get_master_deposit_addresses(self, coin: str) -> Dict[str, Any]:
-        data = self._request_get("/v5/asset/deposit/query-address", params={"coin": coin})
+    async def get_master_deposit_addresses(self, coin: str) -> Dict[str, Any]:
+        data = await self._request_get("/v5/asset/deposit/query-address", params={"coin": coin})
         return (data.get("result") or {})
 
 
-def build_coin_chain_index(coin_rows: List[Dict[str, Any]]) -> Dict[Tuple[str, str], Dict[str, Any]]:
+# coin-info chain fields joined onto each record: (coin-info key, record column)
+COIN_INFO_FIELDS: Tuple[Tuple[str, str], ...] = (
+    ("contractAddress", "coininfo_contractAddress_full"),
+    ("chainDeposit", "chainDeposit"),
+    ("chainWithdraw", "chainWithdraw"),
+    ("confirmation", "confirmation"),
+    ("safeConfirmNumber", "safeConfirmNumber"),
+    ("depositMin", "depositMin"),
+    ("withdrawMin", "withdrawMin"),
+    ("minAccuracy", "minAccuracy"),
+    ("withdrawFee", "withdrawFee"),
+    ("withdrawPercentageFee", "withdrawPercentageFee"),
+)
+COIN_INFO_COLUMNS: Tuple[str, ...] = tuple(col for _, col in COIN_INFO_FIELDS)
+
+# (suspended, values) for a (coin, chain) missing from coin-info
+CoinChainInfo = Tuple[bool, Tuple[Any, ...]]
+NO_COIN_INFO: CoinChainInfo = (False, ("",) * len(COIN_INFO_FIELDS))
+
+
+def build_coin_chain_index(
+    coin_rows: List[Dict[str, Any]],
+) -> Tuple[Dict[Tuple[str, str], CoinChainInfo], List[str]]:
     """
-    Index coin-info by (coin, chain).
+    Index coin-info by (coin, chain), and collect the sorted coin list in the same pass.
     coin-info contains chains[] with:
       chain, chainType, chainDeposit, chainWithdraw, confirmation, depositMin, withdrawMin, contractAddress, ...
+    Each entry is (deposit suspended?, values in COIN_INFO_FIELDS order with falsy values as ""),
+    so the record builder copies them positionally instead of doing a .get() per field.
     """
-    idx: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    idx: Dict[Tuple[str, str], CoinChainInfo] = {}
+    coins = set()
     for row in coin_rows:
         coin = row.get("coin") or row.get("name")
         if not coin:
             continue
+        coins.add(coin)
         for ch in row.get("chains") or []:
             chain = ch.get("chain")
             if not chain:
                 continue
-            idx[(coin, chain)] = ch
-    return idx
+            suspended = ch.get("chainDeposit") in ("0", 0)
+            idx[(coin, chain)] = (suspended, tuple(ch.get(key) or "" for key, _ in COIN_INFO_FIELDS))
+    return idx, sorted(coins)
 
 
 def export_json(path: str, records: List[Dict[str, Any]]) -> None:
+    if orjson is not None:
+        # Serialized in C straight to UTF-8 bytes, same indent-2 layout
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(records, option=orjson.OPT_INDENT_2))
+        return
     with open(path, "w", encoding="utf-8") as f:
         json.dump(records, f, ensure_ascii=False, indent=2)
 
@@ -189,11 +298,13 @@ def export_csv(path: str, records: List[Dict[str, Any]]) -> None:
         "withdrawFee",
         "withdrawPercentageFee",
     ]
+    # Every record carries all of these keys (see fetch_coin_records), so rows are
+    # plucked straight into tuples instead of going through DictWriter per record
+    getter = itemgetter(*fieldnames)
     with open(path, "w", encoding="utf-8", newline="") as f:
-        w = csv.DictWriter(f, fieldnames=fieldnames)
-        w.writeheader()
-        for r in records:
-            w.writerow({k: r.get(k, "") for k in fieldnames})
+        w = csv.writer(f)
+        w.writerow(fieldnames)
+        w.writerows(map(getter, records))
 
 
 def main() -> int:
@@ -210,78 +321,112 @@ def main() -> int:
                    help="Include chains where coin-info chainDeposit=0 (suspended). Default: exclude.")
     p.add_argument("--sleep", type=float, default=0.05,
                    help="Base sleep between coin requests (seconds). Keep small; rate limits still apply.")
+    p.add_argument("--concurrency", type=int, default=5,
+                   help="Max in-flight deposit-address requests (query-address allows ~5 req/s).")
     args = p.parse_args()
 
     if not args.api_key or not args.api_secret:
         print("ERROR: Set BYBIT_API_KEY and BYBIT_API_SECRET env vars (or pass --api-key/--api-secret).", file=sys.stderr)
         return 2
 
-    client = BybitV5Client(
-        base_url=args.base_url,
-        auth=BybitAuth(api_key=args.api_key, api_secret=args.api_secret, recv_window=str(args.recv_window)),
-    )
-
-    # 1) coin-info (all coins)
-    coin_rows = client.get_coin_info_all()
-    coin_chain_idx = build_coin_chain_index(coin_rows)
+    return asyncio.run(run(args))
 
-    # Build coin list
-    coins = sorted({(r.get("coin") or r.get("name")) for r in coin_rows if (r.get("coin") or r.get("name"))})
 
+async def fetch_coin_records(
+    client: BybitV5Client,
+    coin: str,
+    coin_chain_idx: Dict[Tuple[str, str], CoinChainInfo],
+    include_suspended: bool,
+    sem: asyncio.Semaphore,
+    sleep_s: float,
+) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, str]]]:
+    """
+    Deposit addresses for one coin, joined with coin-info.
+    Returns (records, failure) where failure is None on success.
+    """
     records: List[Dict[str, Any]] = []
-    failures: List[Dict[str, str]] = []
-
-    # 2) deposit addresses per coin
-    for i, coin in enumerate(coins, start=1):
+    async with sem:
         try:
-            result = client.get_master_deposit_addresses(coin=coin)
-            chains = result.get("chains") or []
-            if not chains:
-                # No chains returned -> record as failure (some coins may not have deposit address)
-                failures.append({"coin": coin, "error": "no chains returned"})
-                time.sleep(args.sleep)
-                continue
-
-            for ch in chains:
-                chain = ch.get("chain")  # e.g., ETH, TRX, etc.
-                key = (coin, chain) if chain else None
-                ci = coin_chain_idx.get(key) if key else None
-
-                # Optional: exclude suspended deposit chains unless include-suspended
-                if ci and (ci.get("chainDeposit") == "0" or ci.get("chainDeposit") == 0) and not args.include_suspended:
-                    continue
-
-                rec = {
-                    "coin": coin,
-                    "chain": chain or "",
-                    "chainType": ch.get("chainType", ""),
-                    "addressDeposit": ch.get("addressDeposit", ""),
-                    "tagDeposit": ch.get("tagDeposit", ""),
-                    "batchReleaseLimit": ch.get("batchReleaseLimit", ""),
-                    "deposit_contractAddress_last6": ch.get("contractAddress", ""),
-
-                    # Join from coin-info (if available)
-                    "coininfo_contractAddress_full": (ci.get("contractAddress") if ci else "") or "",
-                    "chainDeposit": (ci.get("chainDeposit") if ci else "") or "",
-                    "chainWithdraw": (ci.get("chainWithdraw") if ci else "") or "",
-                    "confirmation": (ci.get("confirmation") if ci else "") or "",
-                    "safeConfirmNumber": (ci.get("safeConfirmNumber") if ci else "") or "",
-                    "depositMin": (ci.get("depositMin") if ci else "") or "",
-                    "withdrawMin": (ci.get("withdrawMin") if ci else "") or "",
-                    "minAccuracy": (ci.get("minAccuracy") if ci else "") or "",
-                    "withdrawFee": (ci.get("withdrawFee") if ci else "") or "",
-                    "withdrawPercentageFee": (ci.get("withdrawPercentageFee") if ci else "") or "",
-                }
-                records.append(rec)
-
+            result = await client.get_master_deposit_addresses(coin=coin)
         except Exception as e:
-            failures.append({"coin": coin, "error": str(e)})
-
-        # gentle pacing (deposit/query-address is 300 req/min ~= 5 req/s)
-        time.sleep(args.sleep)
+            return records, {"coin": coin, "error": str(e)}
+        finally:
+            # gentle pacing (deposit/query-address is 300 req/min ~= 5 req/s)
+            await asyncio.sleep(sleep_s)
+
+    chains = result.get("chains") or []
+    if not chains:
+        # No chains returned -> record as failure (some coins may not have deposit address)
+        return records, {"coin": coin, "error": "no chains returned"}
+
+    for ch in chains:
+        chain = ch.get("chain")  # e.g., ETH, TRX, etc.
+        suspended, ci_values = coin_chain_idx.get((coin, chain), NO_COIN_INFO)
+
+        # Optional: exclude suspended deposit chains unless include-suspended
+        if suspended and not include_suspended:
+            continue
 
-        if i % 50 == 0:
-            print(f"[{i}/{len(coins)}] collected records={len(records)} failures={len(failures)}", file=sys.stderr)
+        rec = {
+            "coin": coin,
+            "chain": chain or "",
+            "chainType": ch.get("chainType", ""),
+            "addressDeposit": ch.get("addressDeposit", ""),
+            "tagDeposit": ch.get("tagDeposit", ""),
+            "batchReleaseLimit": ch.get("batchReleaseLimit", ""),
+            "deposit_contractAddress_last6": ch.get("contractAddress", ""),
+        }
+        # Join from coin-info (all "" if unavailable)
+        rec.update(zip(COIN_INFO_COLUMNS, ci_values))
+        records.append(rec)
+
+    return records, None
+
+
+async def run(args: argparse.Namespace) -> int:
+    connector = aiohttp.TCPConnector(limit=16)
+    async with aiohttp.ClientSession(connector=connector) as sess:
+        client = BybitV5Client(
+            base_url=args.base_url,
+            auth=BybitAuth(api_key=args.api_key, api_secret=args.api_secret, recv_window=str(args.recv_window)),
+            sess=sess,
+        )
+
+        # 1) coin-info (all coins)
+        coin_rows = await client.get_coin_info_all()
+        coin_chain_idx, coins = build_coin_chain_index(coin_rows)
+
+        if not args.include_suspended:
+            # A coin whose coin-info chains are all deposit-suspended would only yield
+            # records that get filtered out, so skip its query-address call entirely.
+            # Coins without coin-info chains are still fetched.
+            has_active: Dict[str, bool] = {}
+            for (coin, _), (suspended, _) in coin_chain_idx.items():
+                has_active[coin] = has_active.get(coin, False) or not suspended
+            n_before = len(coins)
+            coins = [coin for coin in coins if has_active.get(coin, True)]
+            print(f"Skipping {n_before - len(coins)} coins with all chains deposit-suspended", file=sys.stderr)
+
+        records: List[Dict[str, Any]] = []
+        failures: List[Dict[str, str]] = []
+
+        # 2) deposit addresses per coin, all coins in flight at once behind the semaphore
+        sem = asyncio.Semaphore(args.concurrency)
+        done = 0
+
+        async def fetch(coin: str) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, str]]]:
+            nonlocal done
+            out = await fetch_coin_records(client, coin, coin_chain_idx, args.include_suspended, sem, args.sleep)
+            done += 1
+            if done % 50 == 0:
+                print(f"[{done}/{len(coins)}] coins fetched", file=sys.stderr)
+            return out
+
+        # gather keeps coin order, so the output stays sorted by coin
+        for coin_records, failure in await asyncio.gather(*(fetch(coin) for coin in coins)):
+            records.extend(coin_records)
+            if failure:
+                failures.append(failure)
 
     # 3) write outputs
     if not args.no_json:
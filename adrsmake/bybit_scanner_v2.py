@@ -1,38 +1,45 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import hmac
-import hashlib
 import json
+import orjson
 import time
-import pandas as pd
-
-def load_keys(file_path):
-    keys = {}
-    try:
-        with open(file_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-                if '=' in line:
-                    key, value = line.split('=', 1)
-                    keys[key.strip()] = value.strip()
-    except FileNotFoundError:
-        return None
-    return keys
+import csv
+from concurrent.futures import ThreadPoolExecutor
+from _ratelimit import TokenBucket, rate_aware, record_response
+from bybit_deposit_scanner import adjust_bucket_from_headers
+from _keys import load_keys
+
+# Parallel query-address lookups; the client's bucket keeps them at ~5 req/s
+MAX_WORKERS = 5
 
 class BybitClient:
     def __init__(self, api_key, secret_key):
         self.api_key = api_key
         self.secret_key = secret_key
         self.base_url = "https://api.bybit.com"
+        self._secret_bytes = secret_key.encode("utf-8")
+        self._api_key_bytes = api_key.encode("utf-8")
+        # query-address allows ~5 req/s per key: at least 0.2s between requests
+        self.bucket = TokenBucket(capacity=1, refill_per_sec=5)
+        # Keep-alive session: one TLS handshake, then pooled connections.
+        # urllib3 replays the same signed request, so it only retries connect/read
+        # errors, with total backoff (0.25+0.5+1s) well inside recv_window.
+        # 429s are left to rate_aware, which re-signs and slows the bucket.
+        self.sess = requests.Session()
+        retries = Retry(total=3, connect=3, read=3, status=0, backoff_factor=0.25,
+                        respect_retry_after_header=False)
+        self.sess.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=16, max_retries=retries))
 
     def _get_signature(self, params_str, timestamp):
-        recv_window = "5000"
-        payload = f"{timestamp}{self.api_key}{recv_window}{params_str}"
-        return hmac.new(bytes(self.secret_key, "utf-8"), payload.encode("utf-8"), hashlib.sha256).hexdigest()
+        payload = b"".join((timestamp.encode("ascii"), self._api_key_bytes, b"5000", params_str.encode("utf-8")))
+        return hmac.digest(self._secret_bytes, payload, "sha256").hex()
 
+    # X-Bapi-Limit-Status / Reset-Timestamp retune the bucket after every response
+    @rate_aware(adjust_bucket_from_headers)
     def _request(self, method, endpoint, params=None):
-        timestamp = str(int(time.time() * 1000))
+        timestamp = str(time.time_ns() // 1_000_000)
         recv_window = "5000"
         
         params_str = ""
@@ -60,10 +67,11 @@ class BybitClient:
 
         try:
             if method == "GET":
-                resp = requests.get(url, headers=headers)
+                resp = self.sess.get(url, headers=headers)
             else:
-                resp = requests.post(url, headers=headers, data=params_str)
-            return resp.json()
+                resp = self.sess.post(url, headers=headers, data=params_str)
+            record_response(resp.status_code, resp.headers)
+            return orjson.loads(resp.content)
         except Exception as e:
             print(f"Error: {e}")
             return None
@@ -74,17 +82,25 @@ class BybitClient:
     def get_deposit_address(self, coin, chain_type):
         return self._request('GET', '/v5/asset/deposit/query-address', {'coin': coin, 'chainType': chain_type})
 
+    def get_deposit_addresses(self, coin):
+        # Without chainType, query-address returns every chain of the coin in result.chains
+        return self._request('GET', '/v5/asset/deposit/query-address', {'coin': coin})
+
+# Common EVM chain codes on Bybit, upper-cased once for is_evm_chain
+EVM_CHAINS = frozenset(c.upper() for c in (
+    'ETH', 'BSC', 'Arbitrum One', 'ARBI', 'MANTLE', 'MATIC', 'AVAXC', 'OPTIMISM', 'OP',
+    'ZKST', 'ZKSYNC', 'LINEA', 'BASE', 'CELO', 'FTM', 'GLMR', 'MOVR', 'KAVA', 'KAVAEVM'
+))
+
+def chains_by_type(addr_resp):
+    # chainType -> entry of a coin-wide query-address response (empty on error)
+    if not addr_resp or addr_resp.get('retCode') != 0:
+        return {}
+    return {ch.get('chainType'): ch for ch in (addr_resp.get('result') or {}).get('chains') or []}
+
 def is_evm_chain(chain_type):
-    # Common EVM chain codes on Bybit
-    evm_chains = [
-        'ETH', 'BSC', 'Arbitrum One', 'ARBI', 'MANTLE', 'MATIC', 'AVAXC', 'OPTIMISM', 'OP', 
-        'ZKST', 'ZKSYNC', 'LINEA', 'BASE', 'CELO', 'FTM', 'GLMR', 'MOVR', 'KAVA', 'KAVAEVM'
-    ]
-    if chain_type.upper() in evm_chains:
-        return True
-    if 'ERC20' in chain_type.upper() or 'BEP20' in chain_type.upper():
-        return True
-    return False
+    u = chain_type.upper()
+    return u in EVM_CHAINS or 'ERC20' in u or 'BEP20' in u
 
 def main():
     keys = load_keys('keys.json')
@@ -106,45 +122,43 @@ def main():
     # Store the master EVM address if found
     evm_master_address = None
     
-    print(f"Scanning {len(coins_data)} coins...")
-    
+    # One query-address call per coin covers all of its chains
+    coins = [(item['coin'], [c.get('chainType') for c in item.get('chains', []) if c.get('chainType')])
+             for item in coins_data]
+    print(f"Scanning {len(coins)} coins ({sum(len(types) for _, types in coins)} chains)...")
+
+    def fetch(coin):
+        client.bucket.acquire_sync()
+        return client.get_deposit_addresses(coin)
+
     # Second pass: Scan everything
-    for i, item in enumerate(coins_data):
-        if i % 10 == 0:
-            print(f"Processing {i}/{len(coins_data)}...")
-        coin = item['coin']
-        chains = item.get('chains', [])
-        
-        for chain_info in chains:
-            chain_type = chain_info.get('chainType')
-            if not chain_type: continue
-            
-            # API Call
-            addr_resp = client.get_deposit_address(coin, chain_type)
-            address = None
-            tag = None
-            
-            if addr_resp and addr_resp.get('retCode') == 0:
-                result = addr_resp.get('result', {})
-                rows = result.get('rows', []) if result else []
-                if rows:
-                    address = rows[0].get('address')
-                    tag = rows[0].get('tag')
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        # map() yields in coin order, so the master EVM address pick stays deterministic
+        responses = pool.map(fetch, [coin for coin, _ in coins])
+        for i, ((coin, chain_types), addr_resp) in enumerate(zip(coins, responses)):
+            if i % 10 == 0:
+                print(f"Processing {i}/{len(coins)}...")
+            by_type = chains_by_type(addr_resp)
+
+            for chain_type in chain_types:
+                ch = by_type.get(chain_type, {})
+                address = ch.get('addressDeposit') or None
+                tag = ch.get('tagDeposit') or None
+                if address:
                     print(f"  -> Found {coin} on {chain_type}: {address}")
-            
-            # If we found an EVM address (starts with 0x), save it as master
-            if address and address.startswith('0x') and len(address) == 42:
-                 if not evm_master_address:
-                     print(f"  [!] Found Master EVM Address: {address} (from {coin}-{chain_type})")
-                     evm_master_address = address
-            
-            results.append({
-                'coin': coin,
-                'chain': chain_type,
-                'address': address,
-                'tag': tag
-            })
-            time.sleep(0.05) # fast scan
+
+                # If we found an EVM address (starts with 0x), save it as master
+                if address and address.startswith('0x') and len(address) == 42:
+                     if not evm_master_address:
+                         print(f"  [!] Found Master EVM Address: {address} (from {coin}-{chain_type})")
+                         evm_master_address = address
+
+                results.append({
+                    'coin': coin,
+                    'chain': chain_type,
+                    'address': address,
+                    'tag': tag
+                })
 
     # Post-processing: Fill in missing EVM addresses
     final_results = []
@@ -162,12 +176,17 @@ def main():
         final_results = results
 
     # Save
-    df = pd.DataFrame(final_results)
     # Filter only rows with address
-    df_found = df[df['address'].notna()]
-    
-    df_found.to_csv('bybit_deposit_addresses_fixed.csv', index=False)
-    print(f"Done. Saved {len(df_found)} addresses to bybit_deposit_addresses_fixed.csv")
+    found = [r for r in final_results if r['address'] is not None]
+    fieldnames = ['coin', 'chain', 'address', 'tag']
+    if any('note' in r for r in found):
+        fieldnames.append('note')
+
+    with open('bybit_deposit_addresses_fixed.csv', 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(found)
+    print(f"Done. Saved {len(found)} addresses to bybit_deposit_addresses_fixed.csv")
 
 if __name__ == "__main__":
     main()
@@ -1,9 +1,13 @@
 import json
 import time
-from bybit_deposit_scanner import load_keys, BybitClient
+from bybit_deposit_scanner import load_keys, BybitClient, TRANSIENT_ERRORS
+from _ratelimit import retry_sync
 
-import pandas as pd
-import time
+import csv
+from concurrent.futures import ThreadPoolExecutor
+
+# Parallel query-address lookups; the client's token bucket still paces them
+MAX_WORKERS = 5
 
 def main():
     keys = load_keys('keys.json')
@@ -15,9 +19,12 @@ def main():
     
     print("Fetching ALL Coin Info...")
     # Get all coins
-    resp = client._request('GET', '/v5/asset/coin/query-info')
+    try:
+        resp = retry_sync(client.get_coin_info, exceptions=TRANSIENT_ERRORS)
+    except TRANSIENT_ERRORS as e:
+        resp = f"Request error: {e!r}"
     
-    if not resp or resp['retCode'] != 0:
+    if not isinstance(resp, dict) or resp['retCode'] != 0:
         print(f"Failed to fetch coin info: {resp}")
         return
 
@@ -29,46 +36,57 @@ def main():
     # Store found addresses to minimize API calls if needed? 
     # Actually just iterate. The debug script worked.
     
-    for i, item in enumerate(coins_data):
-        coin_symbol = item['coin']
-        chains = item.get('chains', [])
-        
-        if i % 10 == 0:
-            print(f"Scanning {i}/{len(coins_data)}: {coin_symbol}")
-            
-        for chain in chains:
-            chainType = chain.get('chainType')
-            
-            # Use the EXACT same method call as the debug script
-            addr_resp = client.get_deposit_address(coin_symbol, chainType)
-            
-            # Check response
+    # One query-address call per coin covers all of its chains
+    coins = [(item['coin'], [chain.get('chainType') for chain in item.get('chains', [])])
+             for item in coins_data]
+
+    def fetch(coin_symbol):
+        def attempt():
+            client.bucket.acquire_sync()
+            return client.get_deposit_addresses(coin_symbol)
+
+        try:
+            return retry_sync(attempt, exceptions=TRANSIENT_ERRORS)
+        except TRANSIENT_ERRORS as e:
+            print(f"  Error checking {coin_symbol}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        responses = pool.map(fetch, [coin for coin, _ in coins])
+        for i, ((coin_symbol, chain_types), addr_resp) in enumerate(zip(coins, responses)):
+            if i % 10 == 0:
+                print(f"Scanning {i}/{len(coins)}: {coin_symbol}")
+
+            # Check response: chainType -> that chain's address entry
+            by_type = {}
             if addr_resp and addr_resp.get('retCode') == 0:
-                result_data = addr_resp.get('result', {})
-                res_rows = result_data.get('rows', [])
-                if res_rows:
-                    addr_info = res_rows[0]
-                    address = addr_info.get('address')
-                    tag = addr_info.get('tag')
-                    chain_real = addr_info.get('chain')
-                    
-                    if address:
-                        print(f"  -> MATCH: {coin_symbol} on {chainType} => {address}")
-                        results.append({
-                            'coin': coin_symbol,
-                            'chainType': chainType,
-                            'address': address,
-                            'tag': tag,
-                            'chain': chain_real
-                        })
-            
-            # Small delay to be safe
-            # time.sleep(0.02)
+                by_type = {ch.get('chainType'): ch for ch in (addr_resp.get('result') or {}).get('chains') or []}
+
+            for chainType in chain_types:
+                addr_info = by_type.get(chainType)
+                if not addr_info:
+                    continue
+                address = addr_info.get('addressDeposit')
+                tag = addr_info.get('tagDeposit')
+                chain_real = addr_info.get('chain')
+
+                if address:
+                    print(f"  -> MATCH: {coin_symbol} on {chainType} => {address}")
+                    results.append({
+                        'coin': coin_symbol,
+                        'chainType': chainType,
+                        'address': address,
+                        'tag': tag,
+                        'chain': chain_real
+                    })
+
             
     # Save
     if results:
-        df = pd.DataFrame(results)
-        df.to_csv('bybit_deposit_addresses_v3.csv', index=False)
+        with open('bybit_deposit_addresses_v3.csv', 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=['coin', 'chainType', 'address', 'tag', 'chain'])
+            writer.writeheader()
+            writer.writerows(results)
         print(f"Done! Saved {len(results)} addresses to bybit_deposit_addresses_v3.csv")
     else:
         print("Still found 0 addresses. This is extremely weird given the debug script worked.")
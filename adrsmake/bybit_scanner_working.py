@@ -1,26 +1,19 @@
 import json
+import orjson
 import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import hmac
-import hashlib
 from urllib.parse import urlencode
-import pandas as pd
-
-# Load Keys directly
-def load_keys(file_path):
-    keys = {}
-    try:
-        with open(file_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-                if '=' in line:
-                    key, value = line.split('=', 1)
-                    keys[key.strip()] = value.strip()
-    except:
-        return None
-    return keys
+import csv
+from concurrent.futures import ThreadPoolExecutor
+from _ratelimit import TokenBucket, rate_aware, record_response
+from bybit_deposit_scanner import adjust_bucket_from_headers
+from _keys import load_keys
+
+# Parallel query-address lookups; the client's bucket keeps them at ~5 req/s
+MAX_WORKERS = 5
 
 # EXACT Client class from the working debug script
 class BybitClientWorking:
@@ -28,14 +21,27 @@ class BybitClientWorking:
         self.api_key = api_key
         self.secret_key = secret_key
         self.base_url = "https://api.bybit.com"
+        self._secret_bytes = secret_key.encode("utf-8")
+        self._api_key_bytes = api_key.encode("utf-8")
+        # query-address allows ~5 req/s per key: at least 0.2s between requests
+        self.bucket = TokenBucket(capacity=1, refill_per_sec=5)
+        # Keep-alive session: one TLS handshake, then pooled connections.
+        # urllib3 replays the same signed request, so it only retries connect/read
+        # errors, with total backoff (0.25+0.5+1s) well inside recv_window.
+        # 429s are left to rate_aware, which re-signs and slows the bucket.
+        self.sess = requests.Session()
+        retries = Retry(total=3, connect=3, read=3, status=0, backoff_factor=0.25,
+                        respect_retry_after_header=False)
+        self.sess.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=16, max_retries=retries))
 
     def _get_signature(self, params_str, timestamp):
-        recv_window = "5000"
-        payload = f"{timestamp}{self.api_key}{recv_window}{params_str}"
-        return hmac.new(bytes(self.secret_key, "utf-8"), payload.encode("utf-8"), hashlib.sha256).hexdigest()
+        payload = b"".join((timestamp.encode("ascii"), self._api_key_bytes, b"5000", params_str.encode("utf-8")))
+        return hmac.digest(self._secret_bytes, payload, "sha256").hex()
 
+    # X-Bapi-Limit-Status / Reset-Timestamp retune the bucket after every response
+    @rate_aware(adjust_bucket_from_headers)
     def _request(self, method, endpoint, params=None):
-        timestamp = str(int(time.time() * 1000))
+        timestamp = str(time.time_ns() // 1_000_000)
         recv_window = "5000"
         
         # EXACT logic from debug script
@@ -63,16 +69,27 @@ class BybitClientWorking:
 
         try:
             if method == "GET":
-                resp = requests.get(url, headers=headers)
+                resp = self.sess.get(url, headers=headers)
             else:
-                resp = requests.post(url, headers=headers, data=params_str)
-            return resp.json()
+                resp = self.sess.post(url, headers=headers, data=params_str)
+            record_response(resp.status_code, resp.headers)
+            return orjson.loads(resp.content)
         except:
             return None
 
     def get_deposit_address(self, coin, chain_type):
         return self._request('GET', '/v5/asset/deposit/query-address', {'coin': coin, 'chainType': chain_type})
 
+    def get_deposit_addresses(self, coin):
+        # Without chainType, query-address returns every chain of the coin in result.chains
+        return self._request('GET', '/v5/asset/deposit/query-address', {'coin': coin})
+
+def chains_by_type(addr_resp):
+    # chainType -> entry of a coin-wide query-address response (empty on error)
+    if not addr_resp or addr_resp.get('retCode') != 0:
+        return {}
+    return {ch.get('chainType'): ch for ch in (addr_resp.get('result') or {}).get('chains') or []}
+
 def main():
     keys = load_keys('keys.json')
     if not keys: return
@@ -91,41 +108,40 @@ def main():
     coins_data = resp['result']['rows']
     results = []
     
-    print(f"Scanning {len(coins_data)} coins...")
-    
-    for i, item in enumerate(coins_data):
-        coin = item['coin']
-        chains = item.get('chains', [])
-        
-        if i % 50 == 0:
-            print(f"Checking {i}...")
+    # One query-address call per coin covers all of its chains
+    coins = [(item['coin'], [chain.get('chainType') for chain in item.get('chains', [])])
+             for item in coins_data]
+    print(f"Scanning {len(coins)} coins...")
 
-        for chain in chains:
-            chainType = chain.get('chainType')
-            
-            # Using the working method
-            # Add small sleep to avoid rate limit (which caused empty results before?)
-            time.sleep(0.05) 
-            
-            addr_resp = client.get_deposit_address(coin, chainType)
-            
-            if addr_resp and addr_resp.get('retCode') == 0:
-                rows = addr_resp.get('result', {}).get('rows', [])
-                if rows:
-                    addr_data = rows[0]
-                    addr = addr_data.get('address')
-                    if addr:
-                        print(f"FOUND: {coin} ({chainType}) -> {addr}")
-                        results.append({
-                            'coin': coin,
-                            'chain': chainType,
-                            'address': addr,
-                            'tag': addr_data.get('tag')
-                        })
+    def fetch(coin):
+        # Paced by the token bucket (empty results before came from rate limiting?)
+        client.bucket.acquire_sync()
+        return client.get_deposit_addresses(coin)
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        responses = pool.map(fetch, [coin for coin, _ in coins])
+        for i, ((coin, chain_types), addr_resp) in enumerate(zip(coins, responses)):
+            if i % 50 == 0:
+                print(f"Checking {i}...")
+            by_type = chains_by_type(addr_resp)
+
+            for chainType in chain_types:
+                addr_data = by_type.get(chainType, {})
+                addr = addr_data.get('addressDeposit')
+                if addr:
+                    print(f"FOUND: {coin} ({chainType}) -> {addr}")
+                    results.append({
+                        'coin': coin,
+                        'chain': chainType,
+                        'address': addr,
+                        'tag': addr_data.get('tagDeposit')
+                    })
 
     if results:
-        df = pd.DataFrame(results)
-        df.to_csv('bybit_deposit_addresses_success.csv', index=False)
+        with open('bybit_deposit_addresses_success.csv', 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=['coin', 'chain', 'address', 'tag'])
+            writer.writeheader()
+            writer.writerows(results)
         print("Done. Saved to bybit_deposit_addresses_success.csv")
     else:
         print("Zero found.")
@@ -1,48 +1,69 @@
-import json
+import orjson
 import time
-import requests
+import asyncio
+import aiohttp
 import hmac
 import hashlib
-from urllib.parse import urlencode
-import pandas as pd
-
-def load_keys(file_path):
-    keys = {}
-    try:
-        with open(file_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-                if '=' in line:
-                    key, value = line.split('=', 1)
-                    keys[key.strip()] = value.strip()
-    except:
-        return None
-    return keys
+import re
+import functools
+from urllib.parse import urlencode, quote_plus
+from yarl import URL
+import csv
+from _cache import TTLCache
+from _ratelimit import TokenBucket
+from _keys import load_keys
+
+# In-flight query-address requests (Bybit allows ~10 req/s per IP)
+MAX_CONCURRENCY = 5
+# Bybit asset endpoints allow 10 req/s; stay just under it
+REQUESTS_PER_SEC = 9
+RECV_WINDOW_BYTES = b"5000"
+
+# The account's EVM master address does not change; reuse it across runs
+EVM_MASTER_CACHE_PATH = '.bybit_evm_master.json'
+# Found (coin, chainType) deposit addresses, so a re-run after a crash skips them
+ADDRESS_CACHE_PATH = '.bybit_smart_addresses.json'
+ADDRESS_CACHE_TTL = 7 * 24 * 3600
+
+OUTPUT_CSV = 'bybit_deposit_addresses_smart.csv'
+CSV_FIELDS = ['coin', 'chain_type', 'address', 'tag', 'method']
 
 class BybitSmartClient:
-    def __init__(self, api_key, secret_key):
+    def __init__(self, api_key, secret_key, session):
         self.api_key = api_key
         self.secret_key = secret_key
         self.base_url = "https://api.bybit.com"
+        # Shared aiohttp session, kept open for the whole scan
+        self.sess = session
+        # Shared by every concurrent request, in place of a fixed sleep after each call
+        self.bucket = TokenBucket(capacity=REQUESTS_PER_SEC, refill_per_sec=REQUESTS_PER_SEC)
+        # Keyed HMAC state built once; each signature copies it instead of re-keying
+        self._hmac_template = hmac.new(secret_key.encode("utf-8"), b"", hashlib.sha256)
+        self._api_key_bytes = api_key.encode("utf-8")
+        # Keyed per account without writing the API key itself to disk
+        self.account_key = hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+        # Saved once when the scan ends instead of rewriting the file inside the event loop
+        self.address_cache = TTLCache(ADDRESS_CACHE_PATH, ttl=ADDRESS_CACHE_TTL, autosave=False)
 
     def _get_signature(self, params_str, timestamp):
-        recv_window = "5000"
-        payload = f"{timestamp}{self.api_key}{recv_window}{params_str}"
-        return hmac.new(bytes(self.secret_key, "utf-8"), payload.encode("utf-8"), hashlib.sha256).hexdigest()
+        # Fixed parts are pre-encoded; the whole prehash goes to OpenSSL as one buffer
+        mac = self._hmac_template.copy()
+        mac.update(b"".join((timestamp.encode("ascii"), self._api_key_bytes, RECV_WINDOW_BYTES, params_str.encode("utf-8"))))
+        return mac.hexdigest()
 
-    def _request(self, method, endpoint, params=None):
-        timestamp = str(int(time.time() * 1000))
+    async def _request(self, method, endpoint, params=None, query=None):
+        # query: a GET query string already encoded by the caller, used as-is instead of params
+        await self.bucket.acquire()
+        timestamp = str(time.time_ns() // 1_000_000)
         recv_window = "5000"
         params_str = ""
         url = f"{self.base_url}{endpoint}"
 
-        if method == "GET" and params:
-            params_str = urlencode(params)
+        if method == "GET" and (query or params):
+            params_str = query or urlencode(params)
             url = f"{url}?{params_str}"
         elif method == "POST":
-            params_str = json.dumps(params) if params else ""
+            params_str = orjson.dumps(params).decode() if params else ""
             
         signature = self._get_signature(params_str, timestamp)
 
@@ -57,48 +78,95 @@ class BybitSmartClient:
 
         try:
             if method == "GET":
-                resp = requests.get(url, headers=headers)
+                # encoded=True: send the query exactly as signed, without aiohttp re-quoting it
+                request = self.sess.get(URL(url, encoded=True), headers=headers)
             else:
-                resp = requests.post(url, headers=headers, data=params_str)
-            return resp.json()
+                request = self.sess.post(url, headers=headers, data=params_str)
+            async with request as resp:
+                return await resp.json(content_type=None, loads=orjson.loads)
         except Exception as e:
             print(f"Error: {e}")
             return None
 
-    def get_deposit_address(self, coin, chain_type):
-        return self._request('GET', '/v5/asset/deposit/query-address', {'coin': coin, 'chainType': chain_type})
+    async def get_deposit_address(self, coin, chain_type):
+        # Same string urlencode({'coin': ..., 'chainType': ...}) produces, without the dict round-trip.
+        # _request signs it and sends it pre-encoded, so Bybit sees exactly the signed bytes.
+        query = f"coin={quote_plus(coin)}&chainType={quote_plus(chain_type)}"
+        return await self._request('GET', '/v5/asset/deposit/query-address', query=query)
 
+    async def get_deposit_address_cached(self, coin, chain_type):
+        # Same as get_deposit_address, served from the on-disk cache when known.
+        # Only the found row's address/tag/chain is stored, so failed lookups are retried.
+        key = f"{self.account_key}|{coin}|{chain_type}"
+        row = self.address_cache.get(key)
+        if row is not None and 'address' in row:
+            return {'retCode': 0, 'result': {'rows': [row]}}
+        resp = await self.get_deposit_address(coin, chain_type)
+        rows = (resp.get('result') or {}).get('rows') if resp and resp.get('retCode') == 0 else None
+        if rows:
+            self.address_cache.set(key, {k: rows[0].get(k) for k in ('address', 'tag', 'chain')})
+        return resp
+
+# List of known EVM chains
+# If chainType contains these, it's likely EVM
+EVM_KEYWORDS = [
+    'ETH', 'BSC', 'ERC20', 'BEP20', 'ARBI', 'OPTIMISM', 'MATIC', 'POLYGON', 
+    'AVAXC', 'CELO', 'FTM', 'MANTLE', 'ZK', 'LINEA', 'BASE', 'KAVA'
+]
+_EVM_RE = re.compile('|'.join(map(re.escape, EVM_KEYWORDS)))
+
+@functools.lru_cache(maxsize=None)
 def is_evm(chain_type):
-    # List of known EVM chains
-    # If chainType contains these, it's likely EVM
-    evm_keywords = [
-        'ETH', 'BSC', 'ERC20', 'BEP20', 'ARBI', 'OPTIMISM', 'MATIC', 'POLYGON', 
-        'AVAXC', 'CELO', 'FTM', 'MANTLE', 'ZK', 'LINEA', 'BASE', 'KAVA'
-    ]
-    ct = chain_type.upper()
-    for kw in evm_keywords:
-        if kw in ct:
-            return True
-    return False
+    # Same chainType strings repeat across coins; each is only scanned once
+    return _EVM_RE.search(chain_type.upper()) is not None
 
-def main():
+async def lookup_address(client, sem, coin, chainType):
+    # (coin, chainType, address, tag) from the API; address and tag are None if not found
+    async with sem:
+        addr_resp = await client.get_deposit_address_cached(coin, chainType)
+    if addr_resp and addr_resp.get('retCode') == 0:
+         result = addr_resp.get('result', {})
+         rows = result.get('rows', []) if result else []
+         if rows:
+             address = rows[0].get('address')
+             tag = rows[0].get('tag')
+             if address:
+                 print(f"  -> FOUND via API: {coin} ({chainType}): {address}")
+             return coin, chainType, address, tag
+    return coin, chainType, None, None
+
+async def main():
     keys = load_keys('keys.json')
     if not keys: return
     
     api_key = keys.get('BYBIT_API_KEY')
     secret_key = keys.get('BYBIT_API_SECRET')
-    client = BybitSmartClient(api_key, secret_key)
-    
+
+    connector = aiohttp.TCPConnector(limit=MAX_CONCURRENCY)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        client = BybitSmartClient(api_key, secret_key, session)
+        try:
+            found = await scan(client)
+        finally:
+            client.address_cache.save()
+
+    if found:
+        print(f"Done. Saved {found} addresses to {OUTPUT_CSV}")
+    else:
+        print("No addresses found.")
+
+async def scan(client):
+    # Writes each address row to OUTPUT_CSV as soon as it is known; returns the row count
     print("Fetching ALL Coin Info...")
-    resp = client._request('GET', '/v5/asset/coin/query-info')
+    resp = await client._request('GET', '/v5/asset/coin/query-info')
     if not resp or resp.get('retCode') != 0:
         print("Failed to fetch coin info")
-        return
+        return 0
 
     coins_data = resp['result']['rows']
     print(f"Total coins: {len(coins_data)}")
 
-    results = []
+    found = 0
     
     # 1. Find EVM Master Address
     # Try USDT first, then CELO, then ETH
@@ -110,10 +178,16 @@ def main():
         ('ETH', 'ETH'), ('BNB', 'BSC')
     ]
     
+    evm_cache = TTLCache(EVM_MASTER_CACHE_PATH, ttl=7 * 24 * 3600)
+    evm_master = evm_cache.get(client.account_key)
+    if evm_master:
+        print(f"  [CACHED] Master EVM Address: {evm_master}")
+
+    # Sequential on purpose: stops at the first hit
     for coin, chain in test_targets:
         if evm_master: break
         print(f"  Checking {coin} on {chain}...")
-        addr_resp = client.get_deposit_address(coin, chain)
+        addr_resp = await client.get_deposit_address_cached(coin, chain)
         if addr_resp and addr_resp.get('retCode') == 0:
             result = addr_resp.get('result', {})
             rows = result.get('rows', []) if result else []
@@ -122,67 +196,59 @@ def main():
                 if addr and addr.startswith('0x'):
                     evm_master = addr
                     print(f"  [SUCCESS] Found Master EVM Address: {evm_master}")
+                    evm_cache.set(client.account_key, evm_master)
     
     if not evm_master:
         print("  [WARNING] Could not find Master EVM Address. Will slow scan everything.")
 
     # 2. Iterate all coins
     print("Starting Smart Scan...")
-    
-    for i, item in enumerate(coins_data):
-        coin = item['coin']
-        chains = item.get('chains', [])
-        
-        if i % 50 == 0:
-            print(f"Processing {i}/{len(coins_data)} : {coin}")
-            
-        for chain_info in chains:
-            chainType = chain_info.get('chainType')
-            if not chainType: continue
-            
-            # Strategy:
-            # If EVM and we have master, use master.
-            # Else, query API.
-            
-            address = None
-            tag = None
-            is_inferred = False
-            
-            if evm_master and is_evm(chainType):
-                address = evm_master
-                is_inferred = True
-                # Log inferred only occasionally or not at all to keep clean
-                # print(f"  -> Inferred {coin} ({chainType}): {address}")
-            else:
-                # Query API
-                # Don't query if it's likely EVM but inference failed? No, query everything else.
-                time.sleep(0.04) # Rate limit
-                addr_resp = client.get_deposit_address(coin, chainType)
-                if addr_resp and addr_resp.get('retCode') == 0:
-                     result = addr_resp.get('result', {})
-                     rows = result.get('rows', []) if result else []
-                     if rows:
-                         address = rows[0].get('address')
-                         tag = rows[0].get('tag')
-                         if address:
-                             print(f"  -> FOUND via API: {coin} ({chainType}): {address}")
-            
+
+    # Strategy:
+    # If EVM and we have master, use master.
+    # Else, query API (all such lookups run concurrently behind the semaphore).
+    # Rows are written as they are found; the with block closes the CSV even on Ctrl-C
+    with open(OUTPUT_CSV, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        sem = asyncio.Semaphore(MAX_CONCURRENCY)
+        lookups = []
+        # A (coin, chainType) pair listed twice is only looked up and reported once
+        seen = set()
+        for item in coins_data:
+            coin = item['coin']
+            for chain_info in item.get('chains', []):
+                chainType = chain_info.get('chainType')
+                if not chainType: continue
+                if (coin, chainType) in seen: continue
+                seen.add((coin, chainType))
+                if evm_master and is_evm(chainType):
+                    writer.writerow({
+                        'coin': coin,
+                        'chain_type': chainType,
+                        'address': evm_master,
+                        'tag': None,
+                        'method': 'inferred'
+                    })
+                    found += 1
+                else:
+                    lookups.append(lookup_address(client, sem, coin, chainType))
+        f.flush()
+
+        for lookup in asyncio.as_completed(lookups):
+            coin, chainType, address, tag = await lookup
             if address:
-                results.append({
+                writer.writerow({
                     'coin': coin,
                     'chain_type': chainType,
                     'address': address,
                     'tag': tag,
-                    'method': 'inferred' if is_inferred else 'api'
+                    'method': 'api'
                 })
+                f.flush()
+                found += 1
 
-    # Save
-    if results:
-        df = pd.DataFrame(results)
-        df.to_csv('bybit_deposit_addresses_smart.csv', index=False)
-        print(f"Done. Saved {len(results)} addresses to bybit_deposit_addresses_smart.csv")
-    else:
-        print("No addresses found.")
+    return found
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
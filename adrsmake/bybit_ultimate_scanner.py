@@ -1,52 +1,65 @@
-import requests
+import asyncio
+import aiohttp
 import hmac
 import hashlib
-import json
+import orjson
 import time
-import pandas as pd
-from urllib.parse import urlencode
-
-def load_keys(file_path):
-    keys = {}
-    try:
-        with open(file_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-                if '=' in line:
-                    key, value = line.split('=', 1)
-                    keys[key.strip()] = value.strip()
-    except FileNotFoundError:
-        return None
-    return keys
+import csv
+from urllib.parse import urlencode, quote_plus
+from yarl import URL
+from _ratelimit import TokenBucket, record_response, retry
+from _keys import load_keys
+
+# In-flight query-address requests (Bybit allows ~10 req/s per IP)
+MAX_CONCURRENCY = 5
+# Bybit asset endpoints allow 10 req/s; stay just under it
+REQUESTS_PER_SEC = 9
+RECV_WINDOW_BYTES = b"5000"
+
+OUTPUT_CSV = 'bybit_deposit_addresses_final.csv'
+CSV_FIELDS = ['coin', 'chain_type', 'address', 'tag']
+
+# Network failures worth retrying with backoff (HTTP 429/5xx are retried by retry() too)
+TRANSIENT_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
 
 class BybitClientFinal:
-    def __init__(self, api_key, secret_key):
+    def __init__(self, api_key, secret_key, session):
         self.api_key = api_key
         self.secret_key = secret_key
         self.base_url = "https://api.bybit.com"
+        # Shared aiohttp session, kept open for the whole scan
+        self.sess = session
+        # Shared by every concurrent request, in place of a fixed sleep after each call
+        self.bucket = TokenBucket(capacity=REQUESTS_PER_SEC, refill_per_sec=REQUESTS_PER_SEC)
+        # Keyed HMAC state built once; each signature copies it instead of re-keying
+        self._hmac_template = hmac.new(secret_key.encode("utf-8"), b"", hashlib.sha256)
+        self._api_key_bytes = api_key.encode("utf-8")
+        # Server clock minus local clock, set by sync_time() after a 10002 (timestamp) error
+        self._time_offset_ms = 0
 
     def _get_signature(self, params_str, timestamp):
         # Bybit v5 signature: HMAC_SHA256(timestamp + apiKey + recvWindow + params, secret)
-        recv_window = "5000"
-        payload = f"{timestamp}{self.api_key}{recv_window}{params_str}"
-        return hmac.new(bytes(self.secret_key, "utf-8"), payload.encode("utf-8"), hashlib.sha256).hexdigest()
+        # Fixed parts are pre-encoded; the whole prehash goes to OpenSSL as one buffer
+        mac = self._hmac_template.copy()
+        mac.update(b"".join((timestamp.encode("ascii"), self._api_key_bytes, RECV_WINDOW_BYTES, params_str.encode("utf-8"))))
+        return mac.hexdigest()
 
-    def _request(self, method, endpoint, params=None):
-        timestamp = str(int(time.time() * 1000))
+    async def _request(self, method, endpoint, params=None, query=None):
+        # query: a GET query string already encoded by the caller, used as-is instead of params
+        await self.bucket.acquire()
+        timestamp = str(time.time_ns() // 1_000_000 + self._time_offset_ms)
         recv_window = "5000"
         
         params_str = ""
         url = f"{self.base_url}{endpoint}"
         
-        if method == "GET" and params:
+        if method == "GET" and (query or params):
             # Sort params is recommended but not strictly required for v5 if consistent
             # But let's use urlencode
-            params_str = urlencode(params)
+            params_str = query or urlencode(params)
             url = f"{url}?{params_str}"
         elif method == "POST":
-            params_str = json.dumps(params) if params else ""
+            params_str = orjson.dumps(params).decode() if params else ""
             
         signature = self._get_signature(params_str, timestamp)
 
@@ -61,22 +74,73 @@ class BybitClientFinal:
 
         try:
             if method == "GET":
-                resp = requests.get(url, headers=headers)
+                # encoded=True: send the query exactly as signed, without aiohttp re-quoting it
+                request = self.sess.get(URL(url, encoded=True), headers=headers)
             else:
-                resp = requests.post(url, headers=headers, data=params_str)
-            return resp.json()
+                request = self.sess.post(url, headers=headers, data=params_str)
+            async with request as resp:
+                record_response(resp.status, resp.headers)
+                return await resp.json(content_type=None, loads=orjson.loads)
+        except TRANSIENT_ERRORS:
+            # Let the caller's retry() back off and try again
+            raise
         except Exception as e:
             print(f"Request Error: {e}")
             return None
 
-    def get_all_coins(self):
+    async def sync_time(self):
+        # /v5/market/time is public; its top-level 'time' is the server clock in ms
+        local_ms = time.time_ns() // 1_000_000
+        async with self.sess.get(f"{self.base_url}/v5/market/time") as resp:
+            data = await resp.json(content_type=None, loads=orjson.loads)
+        self._time_offset_ms = int(data['time']) - local_ms
+        print(f"  [TIME] Clock offset to Bybit: {self._time_offset_ms} ms")
+
+    async def get_all_coins(self):
         # Fetch all coin info
-        return self._request('GET', '/v5/asset/coin/query-info')
+        return await self._request('GET', '/v5/asset/coin/query-info')
 
-    def get_deposit_address(self, coin, chain_type):
-        return self._request('GET', '/v5/asset/deposit/query-address', {'coin': coin, 'chainType': chain_type})
+    async def get_deposit_address(self, coin, chain_type):
+        # Same string urlencode({'coin': ..., 'chainType': ...}) produces, without the dict round-trip.
+        # _request signs it and sends it pre-encoded, so Bybit sees exactly the signed bytes.
+        query = f"coin={quote_plus(coin)}&chainType={quote_plus(chain_type)}"
+        return await self._request('GET', '/v5/asset/deposit/query-address', query=query)
 
-def main():
+async def check_chain(client, sem, coin, chain_type):
+    # (coin, chain_type, address, tag) row in CSV_FIELDS order if Bybit returns an address, else None.
+    # Only transport errors and HTTP 429/5xx are retried (with backoff); a 10002 resyncs the
+    # clock and signs once more; any other retCode is a final answer for this pair.
+    async with sem:
+        for resynced in (False, True):
+            try:
+                addr_resp = await retry(lambda: client.get_deposit_address(coin, chain_type),
+                                        exceptions=TRANSIENT_ERRORS)
+            except TRANSIENT_ERRORS as e:
+                print(f"  Error checking {coin}-{chain_type}: {e!r}")
+                return None
+            if addr_resp and addr_resp.get('retCode') == 10002 and not resynced:
+                # Timestamp outside recv_window: local clock is skewed
+                try:
+                    await client.sync_time()
+                except (*TRANSIENT_ERRORS, KeyError, ValueError):
+                    return None
+                continue
+            break
+
+    if addr_resp and addr_resp.get('retCode') == 0:
+        addr_rows = addr_resp.get('result', {}).get('rows', [])
+        if addr_rows:
+            addr_data = addr_rows[0]
+            address = addr_data.get('address')
+            tag = addr_data.get('tag')
+
+            if address:
+                print(f"  [FOUND] {coin} ({chain_type}): {address} (Tag: {tag})")
+                return coin, chain_type, address, tag
+    # logical error or no address e.g. retCode=0 but rows=[]
+    return None
+
+async def main():
     print("Starting Bybit Final Scan...")
     keys = load_keys('keys.json')
     if not keys:
@@ -90,80 +154,47 @@ def main():
         print("Bybit keys missing in keys.json")
         return
 
-    client = BybitClientFinal(api_key, secret_key)
-    
-    # 1. Fetch all coin info
-    print("Fetching coin info from Bybit...")
-    coin_resp = client.get_all_coins()
-    
-    if not coin_resp or coin_resp.get('retCode') != 0:
-        print(f"Error fetching coin info: {coin_resp}")
-        return
+    connector = aiohttp.TCPConnector(limit=MAX_CONCURRENCY)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        client = BybitClientFinal(api_key, secret_key, session)
 
-    coins_rows = coin_resp.get('result', {}).get('rows', [])
-    print(f"Successfully fetched {len(coins_rows)} coins config.")
-    
-    results = []
-    
-    # 2. Iterate
-    for i, row in enumerate(coins_rows):
-        coin = row['coin']
-        chains = row.get('chains', [])
-        
-        # Log progress occasionally
-        if i % 20 == 0:
-            print(f"Processing {i}/{len(coins_rows)}: {coin}")
-            
-        for chain in chains:
-            chain_type = chain.get('chainType')
-            if not chain_type:
-                continue
-                
-            # Request deposit address
-            # Retry logic for robustness
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    addr_resp = client.get_deposit_address(coin, chain_type)
-                    
-                    if addr_resp and addr_resp.get('retCode') == 0:
-                        addr_rows = addr_resp.get('result', {}).get('rows', [])
-                        if addr_rows:
-                            addr_data = addr_rows[0]
-                            address = addr_data.get('address')
-                            tag = addr_data.get('tag')
-                            
-                            if address:
-                                print(f"  [FOUND] {coin} ({chain_type}): {address} (Tag: {tag})")
-                                results.append({
-                                    'coin': coin,
-                                    'chain_type': chain_type,
-                                    'address': address,
-                                    'tag': tag
-                                })
-                        break # Success, break retry loop
-                    elif addr_resp and addr_resp.get('retCode') == 10002:
-                         # Timestamp error?
-                         time.sleep(1)
-                         continue
-                    else:
-                        # logical error or no address e.g. retCode=0 but rows=[]
-                        # This counts as "checked", break retry
-                        break
-                except Exception as e:
-                    print(f"  Error checking {coin}-{chain_type}: {e}")
-                    time.sleep(1)
-            
-            # Rate limit politeness
-            time.sleep(0.05)
-
-    # 3. Save
-    if results:
-        df = pd.DataFrame(results)
-        df.to_csv('bybit_deposit_addresses_final.csv', index=False)
-        print(f"\nScan Complete. Saved {len(results)} addresses to 'bybit_deposit_addresses_final.csv'.")
+        # 1. Fetch all coin info
+        print("Fetching coin info from Bybit...")
+        coin_resp = await client.get_all_coins()
+
+        if not coin_resp or coin_resp.get('retCode') != 0:
+            print(f"Error fetching coin info: {coin_resp}")
+            return
+
+        coins_rows = coin_resp.get('result', {}).get('rows', [])
+        print(f"Successfully fetched {len(coins_rows)} coins config.")
+
+        # 2. Check every (coin, chainType) concurrently, bounded by the semaphore
+        sem = asyncio.Semaphore(MAX_CONCURRENCY)
+        checks = [
+            check_chain(client, sem, row['coin'], chain.get('chainType'))
+            for row in coins_rows
+            for chain in row.get('chains', [])
+            if chain.get('chainType')
+        ]
+        print(f"Checking {len(checks)} coin/chain pairs...")
+
+        # 3. Save: each row is written as its check finishes; the with block closes the CSV even on Ctrl-C
+        found = 0
+        with open(OUTPUT_CSV, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_FIELDS)
+            for check in asyncio.as_completed(checks):
+                row = await check
+                if row:
+                    writer.writerow(row)
+                    f.flush()
+                    found += 1
+
+    if found:
+        print(f"\nScan Complete. Saved {found} addresses to '{OUTPUT_CSV}'.")
     else:
         print("\nScan Complete. No addresses found.")
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
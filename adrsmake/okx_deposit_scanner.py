@@ -1,42 +1,50 @@
-import requests
+import asyncio
+import aiohttp
 import hmac
+import hashlib
 import base64
-import json
+import orjson
+import csv
+from _ratelimit import TokenBucket
 import time
-import pandas as pd
-import datetime
-
-# Helper to load keys (same as others)
-def load_keys(file_path):
-    keys = {}
-    try:
-        with open(file_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-                if '=' in line:
-                    key, value = line.split('=', 1)
-                    keys[key.strip()] = value.strip()
-    except FileNotFoundError:
-        return None
-    return keys
+from _keys import load_keys
+
+# In-flight deposit-address requests (OKX allows 6 req/s on this endpoint)
+MAX_CONCURRENCY = 4
+# OKX deposit-address limit is 6 req/s
+REQUESTS_PER_SEC = 6
+
+OUTPUT_CSV = 'okx_deposit_addresses.csv'
+CSV_FIELDS = ['currency', 'chain', 'address', 'tag', 'selected']
+
+def iso_timestamp():
+    # OKX wants UTC ISO-8601 with milliseconds, e.g. 2020-12-08T09:08:57.715Z
+    ns = time.time_ns()
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(ns // 1_000_000_000)) + f".{ns // 1_000_000 % 1000:03d}Z"
 
 class OKXClient:
-    def __init__(self, api_key, secret_key, passphrase):
+    def __init__(self, api_key, secret_key, passphrase, session):
         self.api_key = api_key
         self.secret_key = secret_key
         self.passphrase = passphrase
         self.base_url = "https://www.okx.com"
+        # Shared aiohttp session, kept open for the whole scan
+        self.sess = session
+        # Shared by every concurrent request, in place of a fixed sleep after each call
+        self.bucket = TokenBucket(capacity=REQUESTS_PER_SEC, refill_per_sec=REQUESTS_PER_SEC)
+        # Keyed HMAC state built once; each signature copies it instead of re-keying
+        self._hmac_template = hmac.new(secret_key.encode('utf-8'), b'', hashlib.sha256)
 
     def _sign(self, timestamp, method, request_path, body=''):
         message = f"{timestamp}{method}{request_path}{body}"
-        mac = hmac.new(bytes(self.secret_key, encoding='utf-8'), bytes(message, encoding='utf-8'), digestmod='sha256')
+        mac = self._hmac_template.copy()
+        mac.update(message.encode('utf-8'))
         d = mac.digest()
         return base64.b64encode(d).decode('utf-8')
 
-    def _request(self, method, endpoint, params=None):
-        timestamp = datetime.datetime.utcnow().isoformat()[:-3] + 'Z'
+    async def _request(self, method, endpoint, params=None):
+        await self.bucket.acquire()
+        timestamp = iso_timestamp()
         
         # OKX query params for GET are appended to url for signature
         url = f"{self.base_url}{endpoint}"
@@ -50,7 +58,7 @@ class OKXClient:
             
         body = ''
         if method == 'POST' and params:
-            body = json.dumps(params)
+            body = orjson.dumps(params).decode()
             
         signature = self._sign(timestamp, method, request_path, body)
         
@@ -64,22 +72,49 @@ class OKXClient:
         
         try:
             if method == 'GET':
-                resp = requests.get(url, headers=headers)
+                request = self.sess.get(url, headers=headers)
             else:
-                resp = requests.post(url, headers=headers, data=body)
-            return resp.json()
+                request = self.sess.post(url, headers=headers, data=body)
+            async with request as resp:
+                return await resp.json(content_type=None, loads=orjson.loads)
         except Exception as e:
             print(f"Error: {e}")
             return None
 
-    def get_currencies(self):
+    async def get_currencies(self):
         # Get list of all currencies and their chains
-        return self._request('GET', '/api/v5/asset/currencies')
+        return await self._request('GET', '/api/v5/asset/currencies')
+
+    async def get_deposit_address(self, ccy):
+        return await self._request('GET', '/api/v5/asset/deposit-address', {'ccy': ccy})
 
-    def get_deposit_address(self, ccy):
-        return self._request('GET', '/api/v5/asset/deposit-address', {'ccy': ccy})
+async def fetch_ccy(client, sem, i, total, ccy):
+    # Rows for every chain OKX has an address for
+    async with sem:
+        print(f"[{i+1}/{total}] Checking {ccy}...")
+        
+        # OKX returns all addresses for a ccy (all chains) in one call
+        resp = await client.get_deposit_address(ccy)
 
-def main():
+    rows = []
+    if resp and resp.get('code') == '0':
+        addrs = resp.get('data', [])
+        for addr_info in addrs:
+            print(f"  -> Found {addr_info['chain']}: {addr_info['addr']}")
+            rows.append({
+                'currency': ccy,
+                'chain': addr_info.get('chain'),
+                'address': addr_info.get('addr'),
+                'tag': addr_info.get('tag'),
+                'selected': addr_info.get('selected')
+            })
+    else:
+        # Code 51000 or others mean no address generated or not supported
+        # print(f"  -> No address found or error: {resp.get('data') or resp.get('msg')}")
+        pass
+    return rows
+
+async def main():
     keys = load_keys('keys.json')
     if not keys:
         print("keys.json not found")
@@ -93,51 +128,39 @@ def main():
         print("Missing OKX keys/passphrase")
         return
 
-    client = OKXClient(api_key, secret_key, passphrase)
+    connector = aiohttp.TCPConnector(limit=MAX_CONCURRENCY)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        client = OKXClient(api_key, secret_key, passphrase, session)
 
-    print("Fetching OKX currencies...")
-    currencies_resp = client.get_currencies()
-    
-    if not currencies_resp or currencies_resp.get('code') != '0':
-        print(f"Failed to fetch currencies: {currencies_resp}")
-        return
+        print("Fetching OKX currencies...")
+        currencies_resp = await client.get_currencies()
 
-    data = currencies_resp.get('data', [])
-    print(f"Found {len(data)} currency configs.")
-    
-    # Extract unique currencies
-    ccy_list = set([item['ccy'] for item in data])
-    print(f"Unique Currencies: {len(ccy_list)}")
-    
-    results = []
-    
-    for i, ccy in enumerate(sorted(ccy_list)):
-        print(f"[{i+1}/{len(ccy_list)}] Checking {ccy}...")
-        
-        # OKX returns all addresses for a ccy (all chains) in one call
-        resp = client.get_deposit_address(ccy)
-        
-        if resp and resp.get('code') == '0':
-            addrs = resp.get('data', [])
-            for addr_info in addrs:
-                print(f"  -> Found {addr_info['chain']}: {addr_info['addr']}")
-                results.append({
-                    'currency': ccy,
-                    'chain': addr_info.get('chain'),
-                    'address': addr_info.get('addr'),
-                    'tag': addr_info.get('tag'),
-                    'selected': addr_info.get('selected')
-                })
-        else:
-            # Code 51000 or others mean no address generated or not supported
-            # print(f"  -> No address found or error: {resp.get('data') or resp.get('msg')}")
-            pass
-            
-        time.sleep(0.1)
+        if not currencies_resp or currencies_resp.get('code') != '0':
+            print(f"Failed to fetch currencies: {currencies_resp}")
+            return
+
+        data = currencies_resp.get('data', [])
+        print(f"Found {len(data)} currency configs.")
+
+        # Extract unique currencies
+        ccy_list = set([item['ccy'] for item in data])
+        print(f"Unique Currencies: {len(ccy_list)}")
+
+        sem = asyncio.Semaphore(MAX_CONCURRENCY)
+        fetches = [fetch_ccy(client, sem, i, len(ccy_list), ccy) for i, ccy in enumerate(sorted(ccy_list))]
+
+        # Each currency's rows are written as soon as its lookup finishes;
+        # the with block closes the CSV even on Ctrl-C
+        with open(OUTPUT_CSV, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            for fetch in asyncio.as_completed(fetches):
+                rows = await fetch
+                if rows:
+                    writer.writerows(rows)
+                    f.flush()
 
-    df = pd.DataFrame(results)
-    df.to_csv('okx_deposit_addresses.csv', index=False)
-    print("Done. Saved to okx_deposit_addresses.csv")
+    print(f"Done. Saved to {OUTPUT_CSV}")
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
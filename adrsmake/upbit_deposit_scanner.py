@@ -1,79 +1,121 @@
-import jwt
+import base64
+import hmac
+import orjson
 import uuid
 import hashlib
-import time
-import requests
-import pandas as pd
+import asyncio
+import aiohttp
+import csv
 from urllib.parse import urlencode
+from yarl import URL
+from _ratelimit import TokenBucket, rate_aware, record_response
+from _cache import TTLCache
+from _keys import load_keys
 
-def load_keys(file_path):
-    keys = {}
+# HS256 JWT header is the same for every token; only the payload and signature change
+JWT_HEADER = b'eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9'  # {"alg":"HS256","typ":"JWT"}
+
+def b64url(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=')
+
+# Currencies handled concurrently (Upbit exchange API allows ~8 req/s)
+MAX_CONCURRENCY = 4
+# Upbit exchange API request budget
+REQUESTS_PER_SEC = 8
+
+OUTPUT_CSV = 'upbit_deposit_addresses.csv'
+# coin_addresses items and the PENDING_GENERATION rows share these columns
+CSV_FIELDS = ['currency', 'net_type', 'deposit_address', 'secondary_address']
+
+# currency -> net_type that generate_coin_address last accepted, so re-runs skip the guessing
+NET_TYPE_CACHE_PATH = '.upbit_net_types.json'
+
+def adjust_bucket_from_headers(bucket, headers):
+    # Upbit reports the requests left in the current second of the endpoint's group,
+    # e.g. Remaining-Req: group=default; min=1800; sec=8
+    remaining = headers.get('Remaining-Req')
+    if not remaining:
+        return
+    fields = dict(part.strip().split('=', 1) for part in remaining.split(';') if '=' in part)
     try:
-        with open(file_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-                if '=' in line:
-                    key, value = line.split('=', 1)
-                    keys[key.strip()] = value.strip()
-    except FileNotFoundError:
-        return None
-    return keys
+        sec = int(fields['sec'])
+    except (KeyError, ValueError):
+        return
+    # Full speed while the second has headroom, slowing down as it runs out
+    bucket.set_rate(min(bucket.base_refill_per_sec, max(sec, 1)))
 
 class UpbitClient:
-    def __init__(self, access_key, secret_key):
+    def __init__(self, access_key, secret_key, session):
         self.access_key = access_key
         self.secret_key = secret_key
         self.server_url = "https://api.upbit.com"
+        # Keyed HMAC state for the token signature, copied per request
+        self._hmac_template = hmac.new(secret_key.encode('utf-8'), b'', hashlib.sha256)
+        # Shared aiohttp session, kept open for the whole scan
+        self.sess = session
+        # Shared by every concurrent request, in place of a fixed sleep after each call
+        self.bucket = TokenBucket(capacity=REQUESTS_PER_SEC, refill_per_sec=REQUESTS_PER_SEC)
+        self.net_type_cache = TTLCache(NET_TYPE_CACHE_PATH, ttl=30 * 24 * 3600)
 
-    def _get_token(self, query_params=None):
+    def _sign_jwt(self, payload):
+        # Hand-built HS256 JWT: header.payload.signature, each part base64url without padding
+        signing_input = JWT_HEADER + b'.' + b64url(orjson.dumps(payload))
+        mac = self._hmac_template.copy()
+        mac.update(signing_input)
+        return (signing_input + b'.' + b64url(mac.digest())).decode('ascii')
+
+    def _get_token(self, query_string=b''):
+        # query_string: the urlencoded params as bytes, hashed as-is (empty when there are none)
         payload = {
             'access_key': self.access_key,
             'nonce': str(uuid.uuid4()),
         }
-        
-        if query_params:
-            query_string = urlencode(query_params)
-            m = hashlib.sha512()
-            m.update(query_string.encode('utf-8'))
-            query_hash = m.hexdigest()
-            payload['query_hash'] = query_hash
+        if query_string:
+            payload['query_hash'] = hashlib.sha512(query_string).hexdigest()
             payload['query_hash_alg'] = 'SHA512'
+        return self._sign_jwt(payload)
 
-        jwt_token = jwt.encode(payload, self.secret_key, algorithm='HS256')
-        return jwt_token
-
-    def _request(self, method, endpoint, params=None):
+    # Remaining-Req retunes the bucket after every response; a 429 waits and is repeated
+    @rate_aware(adjust_bucket_from_headers)
+    async def _request(self, method, endpoint, params=None):
+        await self.bucket.acquire()
         url = self.server_url + endpoint
         headers = {}
-        
+        # Encoded once: the same string is hashed into the token and, for GET, sent as the query
+        query_string = urlencode(params) if params else ''
+
         # Upbit requires token in Authorization header
-        token = self._get_token(params)
+        token = self._get_token(query_string.encode('utf-8'))
         headers['Authorization'] = f'Bearer {token}'
         
         try:
             if method == 'GET':
-                resp = requests.get(url, params=params, headers=headers)
+                if query_string:
+                    url = f"{url}?{query_string}"
+                request = self.sess.get(URL(url, encoded=True), headers=headers)
             else:
-                resp = requests.post(url, json=params, headers=headers)
-            return resp.json()
+                headers['Content-Type'] = 'application/json'
+                request = self.sess.post(url, data=orjson.dumps(params), headers=headers)
+            async with request as resp:
+                record_response(resp.status, resp.headers)
+                return await resp.json(content_type=None, loads=orjson.loads)
         except Exception as e:
             print(f"Error: {e}")
             return None
 
-    def get_market_all(self):
+    async def get_market_all(self):
         # Public
         url = self.server_url + "/v1/market/all"
-        return requests.get(url, params={'isDetails': 'false'}).json()
+        async with self.sess.get(url, params={'isDetails': 'false'}) as resp:
+            return await resp.json(content_type=None, loads=orjson.loads)
 
-    def get_deposit_addresses(self):
+    async def get_deposit_addresses(self):
         # Returns all currently generated addresses (with currency, net_type, etc)
         # Note: Upbit API documentation says GET /v1/deposits/coin_addresses returns keys
         # for generated addresses.
-        return self._request('GET', '/v1/deposits/coin_addresses')
+        return await self._request('GET', '/v1/deposits/coin_addresses')
 
-    def generate_coin_address(self, currency, net_type=None):
+    async def generate_coin_address(self, currency, net_type=None):
         # POST /v1/deposits/generate_coin_address
         # params: currency, net_type (optional? depending on coin)
         params = {'currency': currency}
@@ -84,28 +126,109 @@ class UpbitClient:
             # Docs say: currency, net_type.
             pass
             
-        return self._request('POST', '/v1/deposits/generate_coin_address', params)
+        return await self._request('POST', '/v1/deposits/generate_coin_address', params)
 
-def main():
-    keys = load_keys('keys.json')
-    if not keys:
-        return
+def is_invalid_parameter(resp):
+    # Upbit's rejection of the currency/net_type combination (Korean or English message)
+    err_msg = ((resp.get('error') or {}).get('message') or '') if isinstance(resp, dict) else ''
+    return "잘못된 파라미터" in err_msg or "Invalid parameter" in err_msg
 
-    api_key = keys.get('UPBIT_API_KEY')
-    secret_key = keys.get('UPBIT_API_SECRET')
-    
-    if not api_key or not secret_key:
-        print("Missing Upbit keys")
-        return
+async def generate_for(client, sem, ccy):
+    # Rows recording the generation request for a currency without an address.
+    # Tries the net_type cached from an earlier run (else the default network) first,
+    # falling back to the default network if the cached one is rejected, then common
+    # net_type guesses, one at a time.
+    rows = []
+    async with sem:
+        # Try to generate
+        print(f"  -> Requesting generation for {ccy}...")
 
-    client = UpbitClient(api_key, secret_key)
-    
+        # 1. Try the known net_type, or default (no net_type), first
+        cached_net = client.net_type_cache.get(ccy)
+        resp = await client.generate_coin_address(ccy, net_type=cached_net)
+        stale_net = None
+        if cached_net and is_invalid_parameter(resp):
+            # The cached net_type no longer works: forget it and retry on the default network
+            stale_net = cached_net
+            client.net_type_cache.delete(ccy)
+            cached_net = None
+            resp = await client.generate_coin_address(ccy)
+
+        success = False
+        if isinstance(resp, dict):
+            if resp.get('success'):
+                print("    -> Generation requested (Async).")
+                rows.append({'currency': ccy, 'deposit_address': 'PENDING_GENERATION', 'net_type': cached_net or 'Default'})
+                success = True
+            elif resp.get('error'):
+                 err_msg = resp.get('error').get('message')
+                 # print(f"    -> Error: {err_msg}")
+
+                 # 2. If invalid parameter, try to find net_type
+                 if is_invalid_parameter(resp):
+                     # Fetch withdraw chance info
+                     # Note: withdraws/chance usually returns 'currency': {...}, 'net_type_support': ... or similar?
+                     # Actually Upbit API docs say for 'withdraws/chance':
+                     # Returns: currency dictionary, account dictionary, etc.
+                     # It usually contains 'withdraw_limit' and sometimes 'net_type' info in 'currency' object?
+                     # Let's verify structure by calling it.
+
+                     w_chance = await client._request('GET', '/v1/withdraws/chance', {'currency': ccy})
+
+                     possible_nets = []
+                     # Upbit response structure for withdraws/chance:
+                     # { "member_level": ..., "currency": { "code": "BTC", "withdraw_fee": ... }, ... }
+                     # It doesn't explicitly list "supported deposit net_types".
+                     # However, sometimes we can infer or brute force common ones.
+
+                     # Common Upbit net types:
+                     # ETH, TRX, XRP, FIL, SOL, ADA, ETC, ... (for native)
+                     # ERC20, TRC20, BSC, ... (for tokens)
+                     # Upbit usually uses the ticker symbol as net_type for native (e.g. BTC -> net_type=BTC?)
+                     # Or for tokens: net_type=ETH for ERC20.
+
+                     # Let's try 2 common guesses:
+                     # 1. net_type = ccy (Native)
+                     # 2. net_type = 'ETH' (ERC20)
+                     # 3. net_type = 'TRX' (TRC20)
+
+                     net_guesses = [ccy, 'ETH', 'TRX', 'BSC', 'SOL', 'MATIC']
+
+                     # Ensure unique
+                     net_guesses = list(dict.fromkeys(net_guesses))
+
+                     retry_success = False
+                     for net in net_guesses:
+                         if net == stale_net: continue
+
+                         # Don't try ETH for BTC, obviously? But API handles invalid safely.
+                         # print(f"    -> Retrying with net_type={net}...")
+                         resp2 = await client.generate_coin_address(ccy, net_type=net)
+
+                         if isinstance(resp2, dict) and resp2.get('success'):
+                            print(f"    -> Generation requested (net_type={net}).")
+                            rows.append({'currency': ccy, 'deposit_address': 'PENDING_GENERATION', 'net_type': net})
+                            client.net_type_cache.set(ccy, net)
+                            retry_success = True
+                            break
+                         # else:
+                         #   print(f"      -> Failed: {resp2.get('error').get('message')}")
+
+                     if not retry_success:
+                         print(f"    -> Failed to generate with common networks. Error: {err_msg}")
+                 else:
+                     print(f"    -> Error: {err_msg}")
+    return rows
+
+async def scan(client):
+    # Writes existing addresses and generation requests to OUTPUT_CSV as they come in.
+    # Returns the number of rows saved, or None if the market list could not be fetched
     # 1. Get all markets to know which coins exit
     print("Fetching Upbit Markets...")
-    markets = client.get_market_all()
+    markets = await client.get_market_all()
     if isinstance(markets, dict) and markets.get('error'):
         print(f"Error fetching markets: {markets}")
-        return
+        return None
         
     currencies = set()
     for m in markets:
@@ -116,7 +239,7 @@ def main():
 
     # 2. Get existing addresses first
     print("Fetching existing addresses...")
-    existing_list = client.get_deposit_addresses()
+    existing_list = await client.get_deposit_addresses()
     
     # Map existing: currency -> list of addresses
     existing_map = {}
@@ -131,113 +254,64 @@ def main():
         print(f"Error checking existing addresses: {existing_list}")
         existing_list = []
 
-    results = []
-    
     # 3. For each currency, if address exists, save it.
     # If not, try to generate it? 
     # Caution: Generating 100+ addresses might trigger limits or require confirm.
     # We will try to generate for ALL currencies.
     
-    # Correction: get_withdraw_chance should be a method of UpbitClient, or we add valid_net_types logic here.
-    # But for now, let's just add the method to the class dynamically or use the client object.
-    # Actually, I pasted the def inside main() in previous turn which is wrong or dirty. 
-    # Let's fix the class definition above, but replace_file_content targets a block.
-    # I'll just add a helper function here or assume I added it to class? 
-    # No, I put it inside main in the previous tool use.
-    # Let's clean it up properly.
+    # Currencies without an address are worked on concurrently (bounded by the semaphore);
+    # the net_type guesses for one currency stay sequential.
+    sem = asyncio.Semaphore(MAX_CONCURRENCY)
+    missing = []
+    saved = 0
+    # Save what we have
+    # Since Upbit generation is async, we might not get the new addresses immediately.
+    # But we record the request. The with block closes the CSV even on Ctrl-C.
+    with open(OUTPUT_CSV, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for i, ccy in enumerate(sorted(currencies)):
+
+            print(f"[{i+1}/{len(currencies)}] Checking {ccy}...")
+
+            # Check if we have it
+            if ccy in existing_map:
+                for item in existing_map[ccy]:
+                    print(f"  -> Found existing: {item.get('deposit_address')}")
+                    writer.writerow(item)
+                    saved += 1
+            else:
+                missing.append(ccy)
+        f.flush()
+
+        for generate in asyncio.as_completed([generate_for(client, sem, ccy) for ccy in missing]):
+            rows = await generate
+            if rows:
+                writer.writerows(rows)
+                f.flush()
+                saved += len(rows)
+    return saved
+
+async def main():
+    keys = load_keys('keys.json')
+    if not keys:
+        return
+
+    api_key = keys.get('UPBIT_API_KEY')
+    secret_key = keys.get('UPBIT_API_SECRET')
     
-    # Better approach: Just define a helper function or use client._request directly.
-    def get_withdraw_chance_helper(curr):
-         return client._request('GET', '/v1/withdraws/chance', {'currency': curr})
+    if not api_key or not secret_key:
+        print("Missing Upbit keys")
+        return
 
-    for i, ccy in enumerate(sorted(currencies)):
+    connector = aiohttp.TCPConnector(limit=MAX_CONCURRENCY)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        client = UpbitClient(api_key, secret_key, session)
+        saved = await scan(client)
+        if saved is None:
+            return
 
-        print(f"[{i+1}/{len(currencies)}] Checking {ccy}...")
-        
-        # Check if we have it
-        if ccy in existing_map:
-            for item in existing_map[ccy]:
-                print(f"  -> Found existing: {item.get('deposit_address')}")
-                results.append(item)
-        else:
-            # Try to generate
-            print(f"  -> Requesting generation for {ccy}...")
-            
-            # 1. Try default (no net_type) first
-            resp = client.generate_coin_address(ccy)
-            
-            success = False
-            if isinstance(resp, dict):
-                if resp.get('success'):
-                    print("    -> Generation requested (Async).")
-                    results.append({'currency': ccy, 'deposit_address': 'PENDING_GENERATION', 'net_type': 'Default'})
-                    success = True
-                elif resp.get('error'):
-                     err_msg = resp.get('error').get('message')
-                     # print(f"    -> Error: {err_msg}")
-                     
-                     # 2. If invalid parameter, try to find net_type
-                     if "잘못된 파라미터" in err_msg or "Invalid parameter" in err_msg:
-                         # Fetch withdraw chance info
-                         # Note: withdraws/chance usually returns 'currency': {...}, 'net_type_support': ... or similar?
-                         # Actually Upbit API docs say for 'withdraws/chance':
-                         # Returns: currency dictionary, account dictionary, etc.
-                         # It usually contains 'withdraw_limit' and sometimes 'net_type' info in 'currency' object?
-                         # Let's verify structure by calling it.
-                         
-                         w_chance = get_withdraw_chance_helper(ccy)
-                         
-                         possible_nets = []
-                         # Upbit response structure for withdraws/chance:
-                         # { "member_level": ..., "currency": { "code": "BTC", "withdraw_fee": ... }, ... }
-                         # It doesn't explicitly list "supported deposit net_types".
-                         # However, sometimes we can infer or brute force common ones.
-                         
-                         # Common Upbit net types:
-                         # ETH, TRX, XRP, FIL, SOL, ADA, ETC, ... (for native)
-                         # ERC20, TRC20, BSC, ... (for tokens)
-                         # Upbit usually uses the ticker symbol as net_type for native (e.g. BTC -> net_type=BTC?)
-                         # Or for tokens: net_type=ETH for ERC20.
-                         
-                         # Let's try 2 common guesses:
-                         # 1. net_type = ccy (Native)
-                         # 2. net_type = 'ETH' (ERC20)
-                         # 3. net_type = 'TRX' (TRC20)
-                         
-                         net_guesses = [ccy, 'ETH', 'TRX', 'BSC', 'SOL', 'MATIC']
-                         
-                         # Ensure unique
-                         net_guesses = list(dict.fromkeys(net_guesses))
-                         
-                         retry_success = False
-                         for net in net_guesses:
-                             if net == 'Default': continue
-                             
-                             # Don't try ETH for BTC, obviously? But API handles invalid safely.
-                             # print(f"    -> Retrying with net_type={net}...")
-                             resp2 = client.generate_coin_address(ccy, net_type=net)
-                             
-                             if isinstance(resp2, dict) and resp2.get('success'):
-                                print(f"    -> Generation requested (net_type={net}).")
-                                results.append({'currency': ccy, 'deposit_address': 'PENDING_GENERATION', 'net_type': net})
-                                retry_success = True
-                                break
-                             # else:
-                             #   print(f"      -> Failed: {resp2.get('error').get('message')}")
-                                
-                         if not retry_success:
-                             print(f"    -> Failed to generate with common networks. Error: {err_msg}")
-                     else:
-                         print(f"    -> Error: {err_msg}")
-
-            time.sleep(0.12)
-                             
-    # Save what we have
-    # Since Upbit generation is async, we might not get the new addresses immediately.
-    # But we record the request.
-    df = pd.DataFrame(results)
-    df.to_csv('upbit_deposit_addresses.csv', index=False)
-    print("Done. Saved to upbit_deposit_addresses.csv")
+    print(f"Done. Saved {saved} rows to {OUTPUT_CSV}")
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
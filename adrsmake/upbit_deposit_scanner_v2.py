@@ -1,76 +1,161 @@
-import jwt
+import base64
+import hmac
+import orjson
 import uuid
 import hashlib
-import time
-import requests
+import asyncio
+import sys
+import aiohttp
 import csv
+from operator import itemgetter
 from urllib.parse import urlencode
+from yarl import URL
+from _ratelimit import TokenBucket, rate_aware, record_response, retry
+from upbit_deposit_scanner import adjust_bucket_from_headers
+from _keys import load_keys
 
+# Generation requests in flight at once
+MAX_CONCURRENCY = 8
+# Upbit exchange API request budget
+REQUESTS_PER_SEC = 8
 
-def load_keys(file_path):
-    keys = {}
-    try:
-        with open(file_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-                if '=' in line:
-                    key, value = line.split('=', 1)
-                    keys[key.strip()] = value.strip()
-    except FileNotFoundError:
-        return None
-    return keys
+# Network failures worth retrying with backoff (HTTP 5xx are retried by retry() too)
+TRANSIENT_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+# A hung connection gives up after this long instead of stalling the whole gather
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=10)
+
+
+# HS256 JWT header is the same for every token; only the payload and signature change
+JWT_HEADER = b'eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9'  # {"alg":"HS256","typ":"JWT"}
+
+
+def b64url(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=')
 
 
 class UpbitClient:
-    def __init__(self, access_key, secret_key):
+    def __init__(self, access_key, secret_key, session):
         self.access_key = access_key
         self.secret_key = secret_key
         self.server_url = "https://api.upbit.com"
-
-    def _get_token(self, query_params=None):
+        # Keyed HMAC state for the token signature, copied per request
+        self._hmac_template = hmac.new(secret_key.encode('utf-8'), b'', hashlib.sha256)
+        # Shared aiohttp session, kept open for the whole run
+        self.sess = session
+        # Shared by every concurrent request, in place of a fixed sleep after each call
+        self.bucket = TokenBucket(capacity=REQUESTS_PER_SEC, refill_per_sec=REQUESTS_PER_SEC)
+
+    def _sign_jwt(self, payload):
+        # Hand-built HS256 JWT: header.payload.signature, each part base64url without padding
+        signing_input = JWT_HEADER + b'.' + b64url(orjson.dumps(payload))
+        mac = self._hmac_template.copy()
+        mac.update(signing_input)
+        return (signing_input + b'.' + b64url(mac.digest())).decode('ascii')
+
+    def _get_token(self, query_string=b''):
+        # query_string: the urlencoded params as bytes, hashed as-is (empty when there are none)
         payload = {
             'access_key': self.access_key,
             'nonce': str(uuid.uuid4()),
         }
-        if query_params:
-            query_string = urlencode(query_params)
-            m = hashlib.sha512()
-            m.update(query_string.encode('utf-8'))
-            query_hash = m.hexdigest()
-            payload['query_hash'] = query_hash
+        if query_string:
+            payload['query_hash'] = hashlib.sha512(query_string).hexdigest()
             payload['query_hash_alg'] = 'SHA512'
-        return jwt.encode(payload, self.secret_key, algorithm='HS256')
+        return self._sign_jwt(payload)
 
-    def _request(self, method, endpoint, params=None):
+    # Remaining-Req retunes the bucket after every response; a 429 waits and is repeated
+    @rate_aware(adjust_bucket_from_headers)
+    async def _request(self, method, endpoint, params=None):
+        await self.bucket.acquire()
         url = self.server_url + endpoint
-        token = self._get_token(params)
+        # Encoded once: the same string is hashed into the token and, for GET, sent as the query
+        query_string = urlencode(params) if params else ''
+        token = self._get_token(query_string.encode('utf-8'))
         headers = {'Authorization': f'Bearer {token}'}
         try:
             if method == 'GET':
-                resp = requests.get(url, params=params, headers=headers)
+                if query_string:
+                    url = f"{url}?{query_string}"
+                request = self.sess.get(URL(url, encoded=True), headers=headers)
             else:
-                resp = requests.post(url, json=params, headers=headers)
-            return resp.json()
+                headers['Content-Type'] = 'application/json'
+                request = self.sess.post(url, data=orjson.dumps(params), headers=headers)
+            async with request as resp:
+                record_response(resp.status, resp.headers)
+                return await resp.json(content_type=None, loads=orjson.loads)
+        except TRANSIENT_ERRORS:
+            # Let _call()'s retry() back off and try again
+            raise
         except Exception as e:
             print(f"  [ERROR] Request failed: {e}")
             return None
 
-    def get_wallet_status(self):
-        return self._request('GET', '/v1/status/wallet')
+    async def _call(self, method, endpoint, params=None):
+        # _request with up to 3 attempts on transient failures (backoff ~0.2s, 0.4s);
+        # None once they are used up, so one bad request does not sink the batch
+        try:
+            return await retry(lambda: self._request(method, endpoint, params),
+                               attempts=3, base=0.2, exceptions=TRANSIENT_ERRORS)
+        except TRANSIENT_ERRORS as e:
+            print(f"  [ERROR] Request failed: {e!r}")
+            return None
 
-    def get_deposit_addresses(self):
-        return self._request('GET', '/v1/deposits/coin_addresses')
+    async def get_wallet_status(self):
+        return await self._call('GET', '/v1/status/wallet')
 
-    def generate_coin_address(self, currency, net_type=None):
+    async def get_deposit_addresses(self):
+        return await self._call('GET', '/v1/deposits/coin_addresses')
+
+    async def generate_coin_address(self, currency, net_type=None):
         params = {'currency': currency}
         if net_type:
             params['net_type'] = net_type
-        return self._request('POST', '/v1/deposits/generate_coin_address', params)
+        return await self._call('POST', '/v1/deposits/generate_coin_address', params)
+
+
+async def request_generation(client, sem, currency, net_type):
+    # True if Upbit accepted the generation request, False otherwise.
+    # Only failures are printed; progress is shown by run()'s single status line.
+    async with sem:
+        resp = await client.generate_coin_address(currency, net_type if net_type else None)
+
+    if isinstance(resp, dict):
+        if resp.get('success') or resp.get('deposit_address'):
+            return True
+        elif resp.get('error'):
+            err = resp['error']
+            msg = err.get('message', err.get('name', 'unknown'))
+            print(f"\n    -> 실패 ({currency}/{net_type}): {msg}")
+            return False
+        else:
+            # 요청 완료
+            return True
+    else:
+        print(f"\n    -> 오류 ({currency}/{net_type}): {resp}")
+        return False
+
+
+def count_ready(addresses):
+    # Entries still being generated come back without a deposit_address
+    return sum(1 for addr in addresses if addr.get('deposit_address'))
+
 
+async def wait_for_addresses(client, target_count, timeout=15, interval=2):
+    # Re-query coin_addresses every `interval` seconds until `target_count` addresses
+    # are ready or `timeout` runs out; returns the last response
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        addresses = await client.get_deposit_addresses()
+        if isinstance(addresses, list) and count_ready(addresses) >= target_count:
+            return addresses
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            return addresses
+        await asyncio.sleep(min(interval, remaining))
 
-def main():
+
+async def main():
     keys = load_keys('keys.json')
     if not keys:
         print("keys.json 파일을 찾을 수 없습니다.")
@@ -82,13 +167,18 @@ def main():
         print("Upbit API 키가 없습니다.")
         return
 
-    client = UpbitClient(api_key, secret_key)
+    # One pooled keep-alive connector to api.upbit.com for all steps; DNS is resolved once
+    connector = aiohttp.TCPConnector(limit=MAX_CONCURRENCY, ttl_dns_cache=300, keepalive_timeout=60)
+    async with aiohttp.ClientSession(connector=connector, timeout=REQUEST_TIMEOUT) as session:
+        await run(UpbitClient(api_key, secret_key, session))
+
 
+async def run(client):
     # Step 1: 전체 코인/네트워크 목록 가져오기
     print("=" * 60)
     print("[1/5] 업비트 지갑 상태 조회 중 (전체 코인/네트워크)...")
     print("=" * 60)
-    wallet_status = client.get_wallet_status()
+    wallet_status = await client.get_wallet_status()
 
     if not isinstance(wallet_status, list):
         print(f"지갑 상태 조회 실패: {wallet_status}")
@@ -100,29 +190,26 @@ def main():
     print("=" * 60)
     print("[2/5] 기존 입금 주소 조회 중...")
     print("=" * 60)
-    existing = client.get_deposit_addresses()
+    existing = await client.get_deposit_addresses()
 
-    existing_set = set()
     if isinstance(existing, list):
-        for item in existing:
-            key = (item.get('currency', ''), item.get('net_type', ''))
-            existing_set.add(key)
+        existing_set = frozenset((item.get('currency', ''), item.get('net_type', '')) for item in existing)
         print(f"기존 주소 {len(existing)}개 확인됨\n")
     else:
         print(f"기존 주소 조회 오류: {existing}")
-        existing = []
+        existing_set = frozenset()
 
     # Step 3: 없는 주소 생성 요청
     print("=" * 60)
     print("[3/5] 누락된 입금 주소 생성 중...")
     print("=" * 60)
 
-    gen_count = 0
     skip_count = 0
-    fail_count = 0
-    total = len(wallet_status)
+    # Generation requests run concurrently, bounded by the semaphore and the client's bucket
+    sem = asyncio.Semaphore(MAX_CONCURRENCY)
+    pending = []
 
-    for i, wallet in enumerate(wallet_status):
+    for wallet in wallet_status:
         currency = wallet.get('currency', '')
         net_type = wallet.get('net_type', '')
         wallet_state = wallet.get('wallet_state', '')
@@ -137,26 +224,27 @@ def main():
             skip_count += 1
             continue
 
-        print(f"  [{i+1}/{total}] {currency}/{net_type} 생성 요청...")
-        resp = client.generate_coin_address(currency, net_type if net_type else None)
-
-        if isinstance(resp, dict):
-            if resp.get('success') or resp.get('deposit_address'):
-                gen_count += 1
-                print(f"    -> 성공")
-            elif resp.get('error'):
-                err = resp['error']
-                msg = err.get('message', err.get('name', 'unknown'))
-                print(f"    -> 실패: {msg}")
-                fail_count += 1
-            else:
-                gen_count += 1
-                print(f"    -> 요청 완료")
+        pending.append(request_generation(client, sem, currency, net_type))
+
+    # One status line on stderr, rewritten in place as requests finish.
+    # An unexpected exception in one request is counted as a failure instead of
+    # abandoning the rest of the batch.
+    gen_count = 0
+    fail_count = 0
+    for done, generation in enumerate(asyncio.as_completed(pending), 1):
+        try:
+            ok = await generation
+        except Exception as e:
+            print(f"\n    -> 오류: {e!r}")
+            ok = False
+        if ok:
+            gen_count += 1
         else:
-            print(f"    -> 오류: {resp}")
             fail_count += 1
-
-        time.sleep(0.15)
+        sys.stderr.write(f"\r  [{done}/{len(pending)}] 성공 {gen_count}, 실패 {fail_count}")
+        sys.stderr.flush()
+    if pending:
+        sys.stderr.write("\n")
 
     print(f"\n생성 요청 완료: 성공 {gen_count}, 스킵 {skip_count}, 실패 {fail_count}")
 
@@ -164,16 +252,17 @@ def main():
     if gen_count > 0:
         wait_sec = 15
         print(f"\n{'=' * 60}")
-        print(f"[4/5] 주소 생성 대기 중 ({wait_sec}초)...")
+        print(f"[4/5] 주소 생성 대기 중 (최대 {wait_sec}초, 2초마다 재조회)...")
         print("=" * 60)
-        time.sleep(wait_sec)
+        # Stops early once every requested address has shown up
+        ready_before = count_ready(existing) if isinstance(existing, list) else 0
+        final_addresses = await wait_for_addresses(client, ready_before + gen_count, timeout=wait_sec)
     else:
         print(f"\n{'=' * 60}")
         print("[4/5] 새 생성 없음, 바로 조회...")
         print("=" * 60)
-
-    print("전체 입금 주소 재조회 중...")
-    final_addresses = client.get_deposit_addresses()
+        print("전체 입금 주소 재조회 중...")
+        final_addresses = await client.get_deposit_addresses()
 
     if not isinstance(final_addresses, list):
         print(f"최종 조회 실패: {final_addresses}")
@@ -186,22 +275,24 @@ def main():
     print("[5/5] CSV 저장 중...")
     print("=" * 60)
 
-    sorted_addrs = sorted(final_addresses, key=lambda x: x.get('currency', ''))
+    # Every item gets a currency so the sort can use the C-level itemgetter key
+    for addr in final_addresses:
+        addr.setdefault('currency', '')
+    sorted_addrs = sorted(final_addresses, key=itemgetter('currency'))
 
-    with open('upbit_deposit_addresses.csv', 'w', newline='') as f:
+    # One writerows call over a generator, into a 1 MiB buffer flushed on close
+    with open('upbit_deposit_addresses.csv', 'w', newline='', encoding='utf-8', buffering=1 << 20) as f:
         writer = csv.writer(f)
         writer.writerow(['currency', 'net_type', 'deposit_address', 'secondary_address'])
-        for addr in sorted_addrs:
-            writer.writerow([
-                addr.get('currency', ''),
-                addr.get('net_type', ''),
-                addr.get('deposit_address', ''),
-                addr.get('secondary_address', '')
-            ])
+        writer.writerows(
+            (addr.get('currency', ''), addr.get('net_type', ''),
+             addr.get('deposit_address', ''), addr.get('secondary_address', ''))
+            for addr in sorted_addrs
+        )
 
     print(f"upbit_deposit_addresses.csv 에 {len(final_addresses)}개 주소 저장 완료")
     print("\n완료!")
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())